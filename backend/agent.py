@@ -1,9 +1,15 @@
-from livekit.agents import Agent, function_tool
-from tools.flights import search_flights
+from livekit.agents import Agent, RunContext, function_tool
+from tools.flights import search_flights, search_group_flights, search_price_calendar
 from tools.hotels import search_hotels
-from tools.events import search_events
-from tools.emails import send_email
-from models import SearchFlightRequest, SearchHotelRequest, SearchEventRequest, SendEmail
+from tools.events import search_events, MAX_EVENT_DAYS
+from tools.emails import send_trip_email, email_status
+from tools.results import more_results
+from tools.tracing import traced_tool
+from tools.prefetch import PrefetchScheduler
+from tools.trip_state import TripState
+from tools.locations import airport_code, city_code, city_name, resolve_location
+from tools.progress import progressive
+from models import SearchFlightRequest, SearchGroupFlightsRequest, SearchFlightCalendarRequest, SearchHotelRequest, SearchEventRequest, SendTripEmail
 
 
 class TripPlannerAgent(Agent):
@@ -19,22 +25,40 @@ class TripPlannerAgent(Agent):
             - Their travel dates
             
             Use the search_flights tool to find flight options for them based on their answers.
+            When the user asks about flying a few days earlier or later, or for the cheapest day, use the
+            flight_price_calendar tool instead of searching flights again.
+            When friends fly from different cities, use the search_group_flights tool once with all their origins
+            to find the destinations that are cheapest and most direct for the whole group.
             Use the search_hotels tool to find hotel options for them based on their answers.
             Use the search_events tool to find events.
+            Slow searches answer in two steps. When a tool says it is still running, briefly tell the user what it
+            found so far, or that you are looking, and do not call it again; the complete results follow on their own.
+            When a tool answer says more results are available, call more_results with its handle instead of searching again.
             Explain the best flight options you find, including prices and airlines.
             The user will provide city names and you will have to use their IATA codes to search for flights.
+            When you are not sure about a code, or a city has several airports, call resolve_location with the place name.
             Do not use hashtags in your answers. Without beeing rude, be direct and to the point. 
             Do not list things, explain them.
             
+            Flights, hotels and events come with an ID. Never read IDs out loud, but remember which ones the user chose.
             After providing flight, hotel, and event recommendations, ask the user if they would like to
-            receive all the details by email. If they agree, collect their email address and use the send_email
-            function to deliver a comprehensive trip summary including all recommended flights, accommodations and
-            events discussed.
+            receive all the details by email. If they agree, collect their email address and call send_email
+            with the address and the IDs of the options the user chose; the summary is written for you.
+            Emails are delivered in the background; use email_status if the user asks whether it arrived.
             """
         )
+        # Hotels and events are usually asked for right after flights, start them early
+        self._prefetch = PrefetchScheduler()
+        # What the tools showed this session and what the user picked, for the summary email
+        self._trip = TripState()
+
+    async def on_exit(self) -> None:
+        self._prefetch.cancel()
     
-    @function_tool()
-    async def search_flights(self, originIata: str, destinationIata: str, month: int, day: int):
+    # Progressive tools keep running after their first update, so a repeated call is rejected
+    @function_tool(on_duplicate="reject", duplicate_scope="name_and_args")
+    @traced_tool
+    async def search_flights(self, originIata: str, destinationIata: str, month: int, day: int, context: RunContext = None):
         """
         Search for flights using the Skyscanner API.
         
@@ -44,6 +68,12 @@ class TripPlannerAgent(Agent):
             month: The month of travel (e.g., 8 for August)
             day: The day of travel (e.g., 15 for the 15th)
         """
+        originIata, error = airport_code(originIata)
+        if error:
+            return error
+        destinationIata, error = airport_code(destinationIata)
+        if error:
+            return error
         params = SearchFlightRequest(
             originIata=originIata,
             destinationIata=destinationIata,
@@ -54,11 +84,85 @@ class TripPlannerAgent(Agent):
             locale = "es-ES",
             currency = "EUR"
         )
+        self._prefetch.prefetch_destination(destinationIata, params.year, month, day)
         
-        return search_flights(params)
+        answer = await progressive(
+            context, search_flights(params),
+            f"Still searching flights from {originIata} to {destinationIata}.", self._trip.record,
+        )
+        return self._trip.record(answer)
     
     @function_tool()
-    async def search_hotels(self, locationIata: str, adults: int, month: int, day: int):
+    @traced_tool
+    async def flight_price_calendar(self, originIata: str, destinationIata: str, month: int, day: int, windowDays: int = 3):
+        """
+        Compare the cheapest fares for each day around a travel date, e.g. to answer "what about a day earlier?".
+        
+        Args:
+            originIata: The origin airport code (IATA code, e.g., 'JFK')
+            destinationIata: The destination airport code (IATA code, e.g., 'LAX')
+            month: The month of travel (e.g., 8 for August)
+            day: The day of travel (e.g., 15 for the 15th)
+            windowDays: How many days before and after the travel day to compare (0 to 15)
+        """
+        originIata, error = airport_code(originIata)
+        if error:
+            return error
+        destinationIata, error = airport_code(destinationIata)
+        if error:
+            return error
+        params = SearchFlightCalendarRequest(
+            originIata=originIata,
+            destinationIata=destinationIata,
+            year=2025,
+            month=month,
+            day=day,
+            windowDays=max(0, min(windowDays, 15)),
+            market = "ES",
+            locale = "es-ES",
+            currency = "EUR"
+        )
+        
+        return await search_price_calendar(params)
+    
+    @function_tool(on_duplicate="reject", duplicate_scope="name_and_args")
+    @traced_tool
+    async def search_group_flights(self, originIatas: list[str], destinationIatas: list[str], month: int, day: int, rankBy: str = "total", context: RunContext = None):
+        """
+        Find the best meeting destination for friends flying from different cities using the Skyscanner API.
+        
+        Args:
+            originIatas: The origin airport codes of every friend (IATA codes, e.g., ['BCN', 'LHR'])
+            destinationIatas: Candidate destination airport codes, or an empty list to search anywhere
+            month: The month of travel (e.g., 8 for August)
+            day: The day of travel (e.g., 15 for the 15th)
+            rankBy: 'total' to minimise the sum of all fares, 'max' to minimise the most expensive fare
+        """
+        origins = [airport_code(iata) for iata in originIatas]
+        destinations = [airport_code(iata) for iata in destinationIatas]
+        errors = [error for _, error in origins + destinations if error]
+        if errors:
+            return " ".join(errors)
+        params = SearchGroupFlightsRequest(
+            originIatas=[code for code, _ in origins],
+            destinationIatas=[code for code, _ in destinations],
+            year=2025,
+            month=month,
+            day=day,
+            rankBy="max" if rankBy == "max" else "total",
+            market = "ES",
+            locale = "es-ES",
+            currency = "EUR"
+        )
+        
+        return await progressive(
+            context, search_group_flights(params),
+            f"Still comparing fares from {', '.join(params.originIatas)} for the whole group.",
+        )
+    
+    @function_tool(on_duplicate="reject", duplicate_scope="name_and_args")
+    @traced_tool
+    async def search_hotels(self, locationIata: str, adults: int, month: int, day: int, context: RunContext = None):
         """
         Search for hotels using the Amadeus API.
         
@@ -68,6 +172,9 @@ class TripPlannerAgent(Agent):
             month: The month of travel (e.g., 8 for August)
             day: The day of travel (e.g., 15 for the 15th)
         """
+        locationIata, error = city_code(locationIata)
+        if error:
+            return error
         params = SearchHotelRequest(
             locationIata=locationIata,
             adults=adults,
@@ -75,11 +182,16 @@ class TripPlannerAgent(Agent):
             month=month,
             day=day,
         )
+        self._prefetch.adults = adults
         
-        return search_hotels(params)
+        answer = await progressive(
+            context, search_hotels(params), f"Still searching hotels in {locationIata}.", self._trip.record,
+        )
+        return self._trip.record(answer)
 
-    @function_tool()
-    async def search_events(self, location: str, month: int, day: int):
+    @function_tool(on_duplicate="reject", duplicate_scope="name_and_args")
+    @traced_tool
+    async def search_events(self, location: str, month: int, day: int, days: int = 5, context: RunContext = None):
         """
         Search for events using the Ticketmaster, Meetup, Amadeus APIs.
         
@@ -87,30 +199,67 @@ class TripPlannerAgent(Agent):
             location: The location for event search (e.g., 'Barcelona')
             month: The month of travel (e.g., 8 for August)
             day: The day of travel (e.g., 15 for the 15th)
+            days: How many days from the travel day to cover, e.g. the length of the stay (1 to 14)
         """
         params = SearchEventRequest(
-            location=location,
+            location=city_name(location),
             year=2025,
             month=month,
             day=day,
+            days=max(1, min(days, MAX_EVENT_DAYS)),
         )
         
-        return search_events(params)
+        answer = await progressive(
+            context, search_events(params), f"Still searching events in {params.location}.", self._trip.record,
+        )
+        return self._trip.record(answer)
 
     @function_tool()
-    async def send_email(self, email: str, subject: str, content: str):
+    @traced_tool
+    async def resolve_location(self, name: str):
         """
-        Send email.
+        Find the airport IATA codes and the city code of a place, in any language (e.g., 'Londres', 'Heathrow').
+        
+        Args:
+            name: The city or airport name as the user said it
+        """
+        return resolve_location(name)
+
+    @function_tool()
+    @traced_tool
+    async def more_results(self, handle: str):
+        """
+        Get the next page of a previous flight, hotel or event search without searching again.
+        
+        Args:
+            handle: The handle given in the previous tool answer (e.g., 'h12')
+        """
+        return self._trip.record(more_results(handle))
+
+    @function_tool()
+    @traced_tool
+    async def send_email(self, email: str, selection: list[str]):
+        """
+        Email the user a summary of the trip options they chose.
         
         Args:
             email: The email address to send the information. Make sure to get the correct address from the user.
-            subject: The subject of the email
-            content: The content of the email in HTML format
+            selection: IDs of the flights, hotels and events the user chose (e.g., ['F3', 'H12', 'E7']), empty for the best options shown
         """
-        params = SendEmail(
+        params = SendTripEmail(
             email=email,
-            subject=subject,
-            content=content 
+            selection=selection
         )
         
-        return send_email(params)
\ No newline at end of file
+        return await send_trip_email(self._trip, params)
+
+    @function_tool()
+    @traced_tool
+    async def email_status(self, message_id: str):
+        """
+        Check whether a previously sent email was delivered.
+        
+        Args:
+            message_id: The id returned by send_email
+        """
+        return await email_status(message_id)
@@ -0,0 +1,118 @@
+"""
+Cold-start profile of the agent worker.
+
+Imports main.py in a fresh interpreter with -X importtime and reports the
+packages and modules the import spends its time on. With --prewarm it also
+times loading the VAD and noise cancellation models. Time to first greeting is read
+from the first_greeting spans real sessions wrote to TRACE_DIR (run the
+worker with TRACE_DIR set and join a few rooms first).
+
+    python benchmarks/cold_start.py --top 15 --prewarm --trace-dir traces
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The turn detector needs a running job, its share of prewarm only shows in first_greeting spans
+PREWARM_SCRIPT = """
+import time
+started = time.time()
+import main
+print(f"import main: {(time.time() - started) * 1000:.0f} ms")
+for name, load in (("silero VAD", main.silero.VAD.load), ("noise cancellation", main.noise_cancellation.BVC)):
+    started = time.time()
+    load()
+    print(f"{name}: {(time.time() - started) * 1000:.0f} ms")
+"""
+
+
+def run_python(args: list[str]) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True)
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """ (module, depth, self us, cumulative us) for each line -X importtime printed """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def report_imports(module: str, top: int):
+    result = run_python(["-X", "importtime", "-c", f"import {module}"])
+    modules = parse_importtime(result.stderr)
+    if result.returncode != 0:
+        print(f"import {module} failed:")
+        print("\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))[-2000:])
+        return
+
+    total = sum(self_us for _, _, self_us, _ in modules)
+    print(f"import {module}: {total / 1000:.0f} ms, {len(modules)} modules")
+
+    packages = {}
+    for name, _, self_us, _ in modules:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print(f"\nTop {top} packages by import time:")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {package:<40} {self_us / 1000:8.1f} ms {self_us / total:6.1%}")
+
+    print(f"\nTop {top} modules by own import time (cumulative in brackets):")
+    for name, _, self_us, cumulative_us in sorted(modules, key=lambda m: -m[2])[:top]:
+        print(f"  {name:<40} {self_us / 1000:8.1f} ms  ({cumulative_us / 1000:.1f} ms)")
+
+
+def report_prewarm():
+    print("\nModel loading (fresh interpreter):")
+    result = run_python(["-c", PREWARM_SCRIPT])
+    if result.returncode != 0:
+        print("  failed, run `python main.py download-files` first?")
+        print("  " + (result.stderr.strip().splitlines() or ["no output"])[-1])
+        return
+    for line in result.stdout.strip().splitlines():
+        print(f"  {line}")
+
+
+def report_greetings(trace_dir: str):
+    greetings = []
+    for path in glob.glob(os.path.join(trace_dir, "timeline-*.jsonl")):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                if record["name"] == "first_greeting":
+                    greetings.append(record)
+    print(f"\nTime to first greeting ({len(greetings)} sessions in {trace_dir}):")
+    if not greetings:
+        print("  no first_greeting spans, run the worker with TRACE_DIR set and join a room")
+        return
+    for label, key in (("job start -> greeting", "ms"), ("process age at job start", "process_age_ms"),
+                       ("import of main.py", "import_ms"), ("prewarm", "prewarm_ms")):
+        values = [record[key] for record in greetings if record.get(key) is not None]
+        if values:
+            p50, p95 = np.percentile(values, [50, 95])
+            print(f"  {label:<26} p50 {p50:8.0f} ms  p95 {p95:8.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to profile the import of")
+    parser.add_argument("--top", type=int, default=15, help="packages and modules to list")
+    parser.add_argument("--prewarm", action="store_true", help="also time loading the models")
+    parser.add_argument("--trace-dir", default=os.getenv("TRACE_DIR") or "", help="where sessions wrote timelines")
+    args = parser.parse_args()
+
+    report_imports(args.module, args.top)
+    if args.prewarm:
+        report_prewarm()
+    if args.trace_dir:
+        report_greetings(args.trace_dir)
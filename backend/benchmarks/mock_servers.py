@@ -0,0 +1,241 @@
+"""
+Local stand-ins for Skyscanner, Amadeus, Ticketmaster and SendGrid.
+
+Each provider runs as its own aiohttp server replaying the payloads in
+benchmarks/payloads, with a configurable latency and error profile. Point
+the tools at them with the *_BASE_URL environment variables, e.g.
+
+    python benchmarks/mock_servers.py --latency 0.2 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+from dataclasses import dataclass
+from aiohttp import web
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "payloads")
+
+# Provider -> environment variable the tools read their base URL from
+BASE_URL_ENV = {
+    "skyscanner": "SKYSCANNER_BASE_URL",
+    "amadeus": "AMADEUS_BASE_URL",
+    "ticketmaster": "TICKETMASTER_BASE_URL",
+    "sendgrid": "SENDGRID_BASE_URL",
+}
+
+# Airport -> (city code, city name) answered by the Amadeus airport lookup
+AIRPORT_CITIES = {
+    "BCN": ("BCN", "Barcelona"),
+    "JFK": ("NYC", "New York"),
+    "LHR": ("LON", "London"),
+    "CDG": ("PAR", "Paris"),
+    "FCO": ("ROM", "Rome"),
+    "LIS": ("LIS", "Lisbon"),
+    "AMS": ("AMS", "Amsterdam"),
+    "BER": ("BER", "Berlin"),
+}
+
+
+@dataclass
+class Profile:
+    """Latency and error behaviour of one mock provider."""
+    latency: float = 0.1       # mean seconds before answering
+    jitter: float = 0.5        # +/- fraction of latency
+    tail_rate: float = 0.01    # share of requests that take tail_factor x latency
+    tail_factor: float = 10.0
+    error_rate: float = 0.0    # share of requests answered with error_status
+    error_status: int = 503
+
+    async def apply(self):
+        """ Sleep like the real provider would, returning an error response or None """
+        delay = self.latency * (1 + random.uniform(-self.jitter, self.jitter))
+        if random.random() < self.tail_rate:
+            delay *= self.tail_factor
+        await asyncio.sleep(max(delay, 0))
+        if random.random() < self.error_rate:
+            return web.json_response({"error": "mock failure"}, status=self.error_status)
+        return None
+
+
+def load_payload(name: str):
+    with open(os.path.join(PAYLOAD_DIR, f"{name}.json")) as f:
+        return json.load(f)
+
+
+def profiled(profile: Profile, handler):
+    async def wrapper(request: web.Request):
+        request.app["requests"] += 1
+        error = await profile.apply()
+        if error is not None:
+            return error
+        return await handler(request)
+    return wrapper
+
+
+def skyscanner_app(profile: Profile) -> web.Application:
+    payload = load_payload("skyscanner_indicative")
+    places = payload["content"]["results"]["places"]
+
+    async def indicative(request: web.Request):
+        body = await request.json()
+        destination = body["query"]["queryLegs"][0]["destinationPlace"].get("queryPlace", {}).get("iata")
+        if not destination:
+            return web.json_response(payload)
+        quotes = {
+            quote_id: quote for quote_id, quote in payload["content"]["results"]["quotes"].items()
+            if places[quote["outboundLeg"]["destinationPlaceId"]]["iata"] == destination
+        }
+        answer = dict(payload, content={"results": dict(payload["content"]["results"], quotes=quotes)})
+        return web.json_response(answer)
+
+    app = web.Application()
+    app["requests"] = 0
+    app.router.add_post("/apiservices/v3/flights/indicative/search", profiled(profile, indicative))
+    return app
+
+
+def amadeus_app(profile: Profile) -> web.Application:
+    token = load_payload("amadeus_token")
+    hotels_by_city = load_payload("amadeus_hotels_by_city")
+    hotel_offers = load_payload("amadeus_hotel_offers")["data"]
+    hotel_names = {hotel["hotelId"]: hotel["name"] for hotel in hotels_by_city["data"]}
+    locations = load_payload("amadeus_locations")
+    activities = load_payload("amadeus_activities")
+
+    async def oauth(request: web.Request):
+        return web.json_response(token)
+
+    async def by_city(request: web.Request):
+        return web.json_response(hotels_by_city)
+
+    async def offers(request: web.Request):
+        # Answer with a recorded offer for every requested hotel id
+        data = []
+        for hotel_id in request.query.get("hotelIds", "").split(","):
+            if not hotel_id:
+                continue
+            offer = copy.deepcopy(hotel_offers[hash(hotel_id) % len(hotel_offers)])
+            offer["hotel"].update(hotelId=hotel_id, name=hotel_names.get(hotel_id, hotel_id))
+            data.append(offer)
+        return web.json_response({"data": data})
+
+    async def reference_locations(request: web.Request):
+        if request.query.get("subType") == "AIRPORT":
+            iata = request.query.get("keyword", "").upper()
+            city_code, city_name = AIRPORT_CITIES.get(iata, (iata, iata.title()))
+            airport = copy.deepcopy(locations["data"][0])
+            airport.update(subType="AIRPORT", iataCode=iata)
+            airport["address"].update(cityCode=city_code, cityName=city_name.upper())
+            return web.json_response({"meta": {"count": 1}, "data": [airport]})
+        return web.json_response(locations)
+
+    async def shopping_activities(request: web.Request):
+        return web.json_response(activities)
+
+    app = web.Application()
+    app["requests"] = 0
+    app.router.add_post("/v1/security/oauth2/token", profiled(profile, oauth))
+    app.router.add_get("/v1/reference-data/locations/hotels/by-city", profiled(profile, by_city))
+    app.router.add_get("/v3/shopping/hotel-offers", profiled(profile, offers))
+    app.router.add_get("/v1/reference-data/locations", profiled(profile, reference_locations))
+    app.router.add_get("/v1/shopping/activities", profiled(profile, shopping_activities))
+    return app
+
+
+def ticketmaster_app(profile: Profile) -> web.Application:
+    events = load_payload("ticketmaster_events")
+
+    async def discovery(request: web.Request):
+        return web.json_response(events)
+
+    app = web.Application()
+    app["requests"] = 0
+    app.router.add_get("/discovery/v2/events.json", profiled(profile, discovery))
+    return app
+
+
+def sendgrid_app(profile: Profile) -> web.Application:
+    async def send(request: web.Request):
+        await request.read()
+        return web.Response(status=202)
+
+    app = web.Application()
+    app["requests"] = 0
+    app.router.add_post("/v3/mail/send", profiled(profile, send))
+    return app
+
+
+PROVIDER_APPS = {
+    "skyscanner": skyscanner_app,
+    "amadeus": amadeus_app,
+    "ticketmaster": ticketmaster_app,
+    "sendgrid": sendgrid_app,
+}
+
+
+class MockServers:
+    """
+    Runs every mock provider on localhost and exports their base URLs.
+    """
+
+    def __init__(self, profiles: dict[str, Profile], host: str = "127.0.0.1"):
+        self.profiles = profiles
+        self.host = host
+        self.runners = {}
+        self.apps = {}
+        self.base_urls = {}
+
+    async def start(self, export_env: bool = True):
+        for provider, build in PROVIDER_APPS.items():
+            app = build(self.profiles.get(provider, Profile()))
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            site = web.TCPSite(runner, self.host, 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            self.apps[provider] = app
+            self.runners[provider] = runner
+            self.base_urls[provider] = f"http://{self.host}:{port}"
+            if export_env:
+                os.environ[BASE_URL_ENV[provider]] = self.base_urls[provider]
+        return self
+
+    def request_counts(self) -> dict[str, int]:
+        return {provider: app["requests"] for provider, app in self.apps.items()}
+
+    async def stop(self):
+        for runner in self.runners.values():
+            await runner.cleanup()
+
+
+def profiles_from_args(args) -> dict[str, Profile]:
+    profile = Profile(latency=args.latency, jitter=args.jitter, tail_rate=args.tail_rate,
+                      error_rate=args.error_rate, error_status=args.error_status)
+    return {provider: profile for provider in PROVIDER_APPS}
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", type=float, default=0.1, help="mean upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.5, help="latency jitter as a fraction of the mean")
+    parser.add_argument("--tail-rate", type=float, default=0.01, help="share of requests hitting a 10x tail")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of injected errors")
+
+
+async def serve_forever(args):
+    servers = await MockServers(profiles_from_args(args)).start(export_env=False)
+    for provider, url in servers.base_urls.items():
+        print(f"{BASE_URL_ENV[provider]}={url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await servers.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_profile_arguments(parser)
+    asyncio.run(serve_forever(parser.parse_args()))
@@ -0,0 +1,123 @@
+"""
+Offline benchmark for TripPlannerAgent's tools.
+
+Starts the mock providers from mock_servers.py, then simulates many rooms
+calling the agent's tools at the same time and reports p50/p95/p99 latency
+per tool, throughput, event-loop lag and upstream request counts.
+
+    python benchmarks/run_benchmarks.py --rooms 50 --turns 3 --latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.mock_servers import MockServers, add_profile_arguments, profiles_from_args  # noqa: E402
+
+# (origin, destination airport, city code, city name) combinations rooms pick from
+ROUTES = [
+    ("BCN", "JFK", "NYC", "New York"),
+    ("BCN", "LHR", "LON", "London"),
+    ("BCN", "CDG", "PAR", "Paris"),
+    ("BCN", "FCO", "ROM", "Rome"),
+    ("BCN", "LIS", "LIS", "Lisbon"),
+    ("BCN", "AMS", "AMS", "Amsterdam"),
+    ("BCN", "BER", "BER", "Berlin"),
+]
+
+
+async def monitor_loop_lag(samples: list, stop: asyncio.Event, interval: float = 0.01):
+    """ Record how late the event loop wakes up; blocking tool code shows up here """
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+async def run_room(agent, route, turns: int, latencies: dict, errors: dict, send_emails: bool):
+    origin, destination, city_code, city = route
+    calls = [
+        ("search_flights", lambda day: agent.search_flights(origin, destination, 8, day)),
+        ("search_group_flights", lambda day: agent.search_group_flights([origin, "LHR"], [], 8, day)),
+        ("search_hotels", lambda day: agent.search_hotels(city_code, 2, 8, day)),
+        ("search_events", lambda day: agent.search_events(city, 8, day)),
+    ]
+    if send_emails:
+        calls.append(("send_email", lambda day: agent.send_email("bench@example.com", [])))
+
+    for _ in range(turns):
+        day = random.randint(10, 20)
+        for name, call in calls:
+            started = time.perf_counter()
+            try:
+                await call(day)
+            except Exception as e:
+                errors[name] = errors.get(name, 0) + 1
+                print(f"{name} failed: {e!r}")
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def report(latencies: dict, errors: dict, wall: float, lag: list, upstream: dict, cache: dict):
+    total_calls = sum(len(values) for values in latencies.values())
+    print(f"\n{'tool':<22}{'calls':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, values in sorted(latencies.items()):
+        p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+        print(f"{name:<22}{len(values):>7}{errors.get(name, 0):>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}")
+    print(f"\nwall time {wall:.2f}s, throughput {total_calls / wall:.1f} tool calls/s")
+    if lag:
+        lag_ms = np.array(lag) * 1000
+        print(f"event loop lag p99 {np.percentile(lag_ms, 99):.1f} ms, max {lag_ms.max():.1f} ms")
+    print(f"upstream requests {upstream}")
+    print(f"cache {cache['sources']}")
+
+
+async def main(args):
+    random.seed(args.seed)
+    servers = await MockServers(profiles_from_args(args)).start()
+    for key in ("SKYSCANNER_API_KEY", "AMADEUS_API_KEY", "AMADEUS_API_SECRET", "TICKETMASTER_API_KEY", "SENDGRID_API_KEY"):
+        os.environ.setdefault(key, "benchmark")
+    reference_dir = tempfile.TemporaryDirectory()
+    os.environ["REFERENCE_DB_PATH"] = os.path.join(reference_dir.name, "reference.sqlite3")
+
+    # Imported late so the tools pick up the mock base URLs
+    from agent import TripPlannerAgent
+    from tools.cache import cache_stats
+    from tools.http_client import close_session
+
+    routes = ROUTES[:max(1, args.distinct_routes)]
+    latencies, errors, lag = {}, {}, []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(lag, stop))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_room(TripPlannerAgent(), random.choice(routes), args.turns, latencies, errors, args.email)
+        for _ in range(args.rooms)
+    ))
+    wall = time.perf_counter() - started
+
+    stop.set()
+    await lag_task
+    report(latencies, errors, wall, lag, servers.request_counts(), cache_stats())
+
+    await close_session()
+    await servers.stop()
+    reference_dir.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=50, help="simultaneous rooms")
+    parser.add_argument("--turns", type=int, default=3, help="tool rounds per room")
+    parser.add_argument("--distinct-routes", type=int, default=len(ROUTES), help="routes rooms choose from")
+    parser.add_argument("--email", action="store_true", help="also send an email per turn")
+    parser.add_argument("--seed", type=int, default=1)
+    add_profile_arguments(parser)
+    asyncio.run(main(parser.parse_args()))
@@ -1,42 +1,121 @@
+import asyncio
+import os
+import time
+import psutil
 from dotenv import load_dotenv
+
+# Tool modules read their base URLs and limits at import time
+load_dotenv()
+
 from livekit import agents
 from livekit.agents import AgentSession, RoomInputOptions
 from livekit.plugins import (
     openai,
-    cartesia,
     deepgram,
     noise_cancellation,
     silero,
 )
 from livekit.plugins.turn_detector.multilingual import MultilingualModel
-from agent import TripPlannerAgent
+from tools.tracing import set_session, dump_session, record_span
 
-load_dotenv()
+# Rooms one worker takes before it reports itself fully loaded
+MAX_JOBS_PER_WORKER = int(os.getenv("MAX_JOBS_PER_WORKER") or "8")
+
+# When this process started and finished importing, to break down cold starts
+PROCESS_STARTED = psutil.Process().create_time()
+IMPORTED_AT = time.time()
+
+
+def prewarm(proc: agents.JobProcess):
+    """
+    Load the models once per process; every job run by it shares them.
+    """
+    started = time.time()
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["noise_cancellation"] = noise_cancellation.BVC()
+
+    # Only job processes need the agent and its tools, the supervisor never loads them
+    from agent import TripPlannerAgent  # noqa: F401
+    from tools.warmup import warm_up_tools  # noqa: F401
+    proc.userdata["prewarm_ms"] = round((time.time() - started) * 1000, 2)
+
+
+def compute_load(worker) -> float:
+    """
+    Report the busier of CPU usage and job slots, so the dispatcher stops
+    sending rooms to a worker whose processes are all busy.
+    """
+    cpu = psutil.cpu_percent(interval=None) / 100
+    jobs = len(worker.active_jobs) / MAX_JOBS_PER_WORKER
+    return min(max(cpu, jobs), 1.0)
 
 
 async def entrypoint(ctx: agents.JobContext):
+    from agent import TripPlannerAgent
+    from tools.warmup import warm_up_tools
+    from tools.emails import outbox
+
+    job_started = time.time()
+    # Every span recorded by this job's tools lands in the room's timeline
+    set_session(ctx.room.name)
+
+    async def write_trace():
+        dump_session(ctx.room.name)
+
+    # The process exits with the job, so "email me the summary, bye" must not leave the email behind
+    async def deliver_emails():
+        await outbox.drain()
+
+    ctx.add_shutdown_callback(write_trace)
+    ctx.add_shutdown_callback(deliver_emails)
+
+    # Open the HTTP pool and Amadeus token while the room connects
+    warm_up = asyncio.create_task(warm_up_tools())
+
     await ctx.connect()
 
     session = AgentSession(
         stt=deepgram.STT(model="nova-3", language="multi"),
         llm=openai.LLM(model="gpt-4o-mini"),
-        tts=openai.TTS(voice="nova"), # tts=cartesia.TTS()
-        vad=silero.VAD.load(),
+        tts=openai.TTS(voice="nova"),
+        vad=ctx.proc.userdata["vad"],
+        # Built per job, the turn detector needs the job context
         turn_detection=MultilingualModel(),
     )
 
+    greeted = False
+
+    def on_agent_state_changed(event):
+        nonlocal greeted
+        # Time to first greeting, for benchmarks/cold_start.py
+        if event.new_state == "speaking" and not greeted:
+            greeted = True
+            record_span(
+                "first_greeting", "session", job_started,
+                process_age_ms=round((job_started - PROCESS_STARTED) * 1000, 2),
+                import_ms=round((IMPORTED_AT - PROCESS_STARTED) * 1000, 2),
+                prewarm_ms=ctx.proc.userdata.get("prewarm_ms"),
+            )
+
+    session.on("agent_state_changed", on_agent_state_changed)
+
     await session.start(
         room=ctx.room,
         agent=TripPlannerAgent(),
         room_input_options=RoomInputOptions(
-            noise_cancellation=noise_cancellation.BVC(), 
+            noise_cancellation=ctx.proc.userdata["noise_cancellation"],
         ),
     )
 
     await session.generate_reply(
         instructions="Greet the user, introduce yourself as a trip planning assistant, and ask where they'd like to travel to."
     )
+    await warm_up
 
 
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    agents.cli.run_app(agents.WorkerOptions(
+        entrypoint_fnc=entrypoint,
+        prewarm_fnc=prewarm,
+        load_fnc=compute_load,
+    ))
\ No newline at end of file
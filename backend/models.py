@@ -1,12 +1,38 @@
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
 class SearchFlightRequest(BaseModel):
     """Parameters for flight search"""
     originIata: str = Field(..., description="Origin airport IATA code (e.g., 'BCN')")
+    destinationIata: Optional[str] = Field(..., description="Destination airport IATA code (e.g., 'JFK'), empty to search anywhere")
+    year: int = Field(..., description="Year of travel")
+    month: int = Field(..., description="Month of travel")
+    day: int = Field(..., description="Day of travel")
+    market: str = Field(default="ES", description="Market country code")
+    locale: str = Field(default="es-ES", description="Locale for results")
+    currency: str = Field(default="EUR", description="Currency for prices")
+
+class SearchFlightCalendarRequest(BaseModel):
+    """Parameters for a flexible-date price calendar around a travel day"""
+    originIata: str = Field(..., description="Origin airport IATA code (e.g., 'BCN')")
     destinationIata: str = Field(..., description="Destination airport IATA code (e.g., 'JFK')")
     year: int = Field(..., description="Year of travel")
     month: int = Field(..., description="Month of travel")
     day: int = Field(..., description="Day of travel")
+    windowDays: int = Field(default=3, ge=0, le=15, description="Days before and after the travel day to compare")
+    market: str = Field(default="ES", description="Market country code")
+    locale: str = Field(default="es-ES", description="Locale for results")
+    currency: str = Field(default="EUR", description="Currency for prices")
+
+class SearchGroupFlightsRequest(BaseModel):
+    """Parameters for a group flight search from several origins"""
+    originIatas: List[str] = Field(..., description="Origin airport IATA codes, one per traveller city")
+    destinationIatas: List[str] = Field(default_factory=list, description="Candidate destination IATA codes, empty to search anywhere")
+    year: int = Field(..., description="Year of travel")
+    month: int = Field(..., description="Month of travel")
+    day: int = Field(..., description="Day of travel")
+    rankBy: Literal["total", "max"] = Field(default="total", description="Rank by total group fare or by the most expensive traveller")
+    limit: int = Field(default=5, description="Number of destinations to return")
     market: str = Field(default="ES", description="Market country code")
     locale: str = Field(default="es-ES", description="Locale for results")
     currency: str = Field(default="EUR", description="Currency for prices")
@@ -25,9 +51,16 @@ class SearchEventRequest(BaseModel):
     year: int = Field(..., description="Year of travel")
     month: int = Field(..., description="Month of travel")
     day: int = Field(..., description="Day of travel")
+    days: int = Field(5, description="Number of days from the day of travel to search")
 
 class SendEmail(BaseModel):
     """Parameters for sending email"""
     email: str = Field(..., description="Email address to send the information")
     subject: str = Field(..., description="Subject of the email")
-    content: str = Field(..., description="Content of the email")
\ No newline at end of file
+    content: str = Field(..., description="Content of the email")
+    contentType: str = Field(default="text/html", description="MIME type of the content")
+
+class SendTripEmail(BaseModel):
+    """Parameters for emailing the trip summary"""
+    email: str = Field(..., description="Email address to send the trip summary to")
+    selection: List[str] = Field(default_factory=list, description="IDs of the flights, hotels and events the user picked, empty for the best options shown")
\ No newline at end of file
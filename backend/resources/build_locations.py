@@ -0,0 +1,102 @@
+"""
+Completes resources/locations.tsv with every airport in the OurAirports dataset.
+
+The hand-curated rows already in the file (metro areas such as LON or NYC and
+the multilingual aliases) are kept as they are. Every airport with an IATA
+code and scheduled service that is missing is added, under the curated city
+of the same name and country when there is one, else under a new city named
+after its municipality whose code is its main airport's.
+
+    curl -sSLO https://davidmegginson.github.io/ourairports-data/airports.csv
+    python resources/build_locations.py airports.csv
+"""
+import argparse
+import csv
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from tools.locations import LOCATIONS_PATH, IATA_CODE, fold  # noqa: E402
+
+# Airport types with scheduled flights, the first listed becomes its city's main airport
+AIRPORT_TYPES = ("large_airport", "medium_airport", "small_airport")
+
+
+def clean(text: str) -> str:
+    """ Field text without the tabs and pipes the TSV format uses as separators """
+    return " ".join(text.replace("|", " ").split())
+
+
+def read_locations(path: str) -> tuple[list[str], list[list[str]]]:
+    """ (comment lines, rows) of a locations.tsv file """
+    comments, rows = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("#"):
+                comments.append(line)
+            elif line.strip():
+                rows.append(line.split("\t"))
+    return comments, rows
+
+
+def read_airports(path: str) -> list[dict]:
+    """ OurAirports airports with an IATA code and scheduled service, bigger airports first """
+    with open(path, newline="", encoding="utf-8") as f:
+        airports = [
+            row for row in csv.DictReader(f)
+            if row["scheduled_service"] == "yes" and row["type"] in AIRPORT_TYPES
+            and IATA_CODE.match(row["iata_code"].strip().upper())
+        ]
+    return sorted(airports, key=lambda row: (AIRPORT_TYPES.index(row["type"]), row["iata_code"]))
+
+
+def added_rows(rows: list[list[str]], airports: list[dict]) -> list[list[str]]:
+    """ Rows for the airports (and their new cities) rows doesn't have yet """
+    airport_codes = {row[1] for row in rows if row[0] == "airport"}
+    city_codes = {row[1] for row in rows if row[0] == "city"}
+    cities = {(row[3], fold(row[4])): row[1] for row in rows if row[0] == "city"}
+    new_cities = {}  # city code -> [city row, airport rows...]
+
+    for airport in airports:
+        code = airport["iata_code"].strip().upper()
+        if code in airport_codes:
+            continue
+        country = airport["iso_country"]
+        municipality = clean(airport["municipality"]) or clean(airport["name"])
+        city = cities.get((country, fold(municipality)))
+        if city is None:
+            if code in city_codes:
+                print(f"Skipping {code}, it is already the code of another city")
+                continue
+            city = cities[(country, fold(municipality))] = code
+            city_codes.add(code)
+            new_cities[code] = [["city", code, code, country, municipality, ""]]
+        aliases = "|".join(clean(keyword) for keyword in airport["keywords"].split(",") if clean(keyword))
+        row = ["airport", code, city, country, clean(airport["name"]), aliases]
+        new_cities.setdefault(city, []).append(row)
+        airport_codes.add(code)
+
+    return [row for code in sorted(new_cities) for row in new_cities[code]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("airports_csv", help="airports.csv from OurAirports")
+    parser.add_argument("--output", default=LOCATIONS_PATH)
+    args = parser.parse_args()
+
+    comments, rows = read_locations(args.output)
+    added = added_rows(rows, read_airports(args.airports_csv))
+    with open(args.output, "w", encoding="utf-8") as f:
+        for line in comments:
+            f.write(line + "\n")
+        for row in rows + added:
+            f.write("\t".join(row) + "\n")
+    print(f"{args.output}: {len(rows)} curated rows, {len(added)} added")
+
+
+if __name__ == "__main__":
+    main()
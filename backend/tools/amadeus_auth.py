@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+from tools.http_client import request_json, REQUEST_ERRORS
+
+AMADEUS_BASE_URL = os.getenv("AMADEUS_BASE_URL") or "https://test.api.amadeus.com"
+
+# Refresh in the background this long before expiry, block only inside the hard margin
+EARLY_REFRESH_SECONDS = 300
+HARD_MARGIN_SECONDS = 30
+
+
+async def get_access_token(client_id, client_secret):
+    """
+    Obtain an access token from the Amadeus API.
+
+    Returns a (token, expires_in) tuple, or (None, 0) on failure.
+    """
+    url = f"{AMADEUS_BASE_URL}/v1/security/oauth2/token"
+    headers = { "Content-Type": "application/x-www-form-urlencoded" }
+    data = {
+        "grant_type": "client_credentials",
+        "client_id": client_id,
+        "client_secret": client_secret
+    }
+
+    try:
+        response = await request_json("POST", url, headers=headers, data=data,
+                                      provider="amadeus", phase="auth") or {}
+        return response.get("access_token"), int(response.get("expires_in", 0))
+    except REQUEST_ERRORS as e:
+        print(f"Request error: {e!r}")
+    except ValueError:
+        print("Error parsing the response JSON.")
+    return None, 0
+
+
+class AmadeusTokenManager:
+    """
+    Process-wide cache for the Amadeus OAuth token.
+
+    The token is reused until shortly before `expires_in`, refreshed early in
+    the background, and concurrent callers share a single refresh request.
+    """
+
+    def __init__(self, client_id: str, client_secret: str):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_task = None
+
+    async def get_token(self):
+        """ Return a valid access token, or None if Amadeus can't be reached """
+        remaining = self._expires_at - time.monotonic()
+        if self._token and remaining > HARD_MARGIN_SECONDS:
+            if remaining < EARLY_REFRESH_SECONDS:
+                self._start_refresh()
+            return self._token
+        return await asyncio.shield(self._start_refresh())
+
+    def invalidate(self):
+        """ Drop the cached token, e.g. after a 401 from Amadeus """
+        self._token = None
+        self._expires_at = 0.0
+
+    def _start_refresh(self) -> asyncio.Task:
+        task = self._refresh_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.create_task(self._refresh())
+            self._refresh_task = task
+        return task
+
+    async def _refresh(self):
+        token, expires_in = await get_access_token(self.client_id, self.client_secret)
+        if token:
+            self._token = token
+            self._expires_at = time.monotonic() + expires_in
+        return token or self._valid_token()
+
+    def _valid_token(self):
+        # A failed early refresh still leaves the old token usable until it expires
+        return self._token if self._expires_at > time.monotonic() else None
+
+
+_manager: AmadeusTokenManager | None = None
+
+
+def get_token_manager() -> AmadeusTokenManager:
+    global _manager
+    if _manager is None:
+        _manager = AmadeusTokenManager(os.getenv("AMADEUS_API_KEY"), os.getenv("AMADEUS_API_SECRET"))
+    return _manager
+
+
+async def amadeus_headers():
+    """
+    Authorization headers for Amadeus calls, or None when no token is available.
+    """
+    token = await get_token_manager().get_token()
+    if token is None:
+        return None
+    return {'Authorization': f'Bearer {token}'}
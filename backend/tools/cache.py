@@ -0,0 +1,172 @@
+import asyncio
+import functools
+import os
+import sys
+import time
+from collections import OrderedDict
+from pydantic import BaseModel
+from tools.tracing import annotate
+from tools.results import rendered
+from tools.ratelimit import boost, current_priority, current_priority_box
+
+# Seconds a result stays fresh, per upstream source
+CACHE_TTLS = {
+    "flights": 600,
+    "flight_calendar": 600,
+    "hotels": 900,
+    "events": 3600,
+}
+DEFAULT_TTL = 300
+MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES") or str(32 * 1024 * 1024))
+
+
+def request_key(source: str, request: BaseModel) -> tuple:
+    """
+    Build a cache key from a request model, ignoring case and stray whitespace.
+    """
+    fields = []
+    for name, value in sorted(request.model_dump().items()):
+        if isinstance(value, str):
+            value = value.strip().casefold()
+        elif isinstance(value, list):
+            value = tuple(v.strip().casefold() if isinstance(v, str) else v for v in value)
+        fields.append((name, value))
+    return (source, tuple(fields))
+
+
+def _size_of(value) -> int:
+    # Compact records report their own size, see IndicativeQuotes
+    if isinstance(value, (str, bytes)) or hasattr(value, "__slots__"):
+        return sys.getsizeof(value)
+    return sys.getsizeof(repr(value))
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache with single-flight coalescing of identical requests.
+
+    Entries are evicted least-recently-used once their estimated size exceeds
+    the byte budget. Concurrent misses on the same key share one upstream call.
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires_at, size, value)
+        self._inflight = {}  # key -> asyncio.Task
+        self._waiters = {}  # key -> callers awaiting the inflight task
+        self._priorities = {}  # key -> priority box of the inflight task
+        self.stats = {}  # source -> {"hits", "misses", "coalesced"}
+
+    def _count(self, source: str, counter: str):
+        annotate(**{f"cache_{source}": counter})
+        counters = self.stats.setdefault(source, {"hits": 0, "misses": 0, "coalesced": 0})
+        counters[counter] += 1
+
+    def get(self, key):
+        """ Return a fresh cached value, or None """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key, value, ttl: float):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self.size += size
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.size -= size
+
+    async def get_or_fetch(self, key, fetch, ttl: float, cacheable=lambda value: value is not None):
+        """
+        Return the cached value for key, or run fetch() once for all concurrent callers.
+        """
+        source = key[0]
+        value = self.get(key)
+        if value is not None:
+            self._count(source, "hits")
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(source, "coalesced")
+            # A tool call joining a prefetch shouldn't wait behind prefetch priority
+            boost(self._priorities.get(key), current_priority())
+        else:
+            self._count(source, "misses")
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            self._priorities[key] = current_priority_box()
+            task.add_done_callback(functools.partial(self._on_fetched, key, ttl, cacheable))
+
+        # Shield so one cancelled caller doesn't cancel the fetch for everyone else,
+        # but stop the upstream call once nobody is waiting for it anymore
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+
+    def _on_fetched(self, key, ttl, cacheable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        self._priorities.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        value = task.result()
+        if cacheable(value):
+            self.put(key, value, ttl)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+response_cache = ResponseCache()
+
+
+def cached_search(source: str, cacheable=lambda value: value is not None):
+    """
+    Decorator caching an async `search_*(params)` function on its request model.
+
+    A ResultTable answer is cached as is and rendered for every caller, so
+    callers sharing it don't share its more_results handle.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(params: BaseModel):
+            key = request_key(source, params)
+            ttl = CACHE_TTLS.get(source, DEFAULT_TTL)
+            return rendered(await response_cache.get_or_fetch(key, lambda: fn(params), ttl, cacheable))
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> dict:
+    """
+    Hit/miss counters per source plus current memory usage.
+    """
+    return {
+        "sources": {source: dict(counters) for source, counters in response_cache.stats.items()},
+        "entries": len(response_cache._entries),
+        "bytes": response_cache.size,
+        "max_bytes": response_cache.max_bytes,
+    }
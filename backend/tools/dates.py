@@ -0,0 +1,9 @@
+from datetime import date
+
+
+def travel_date(year: int, month: int, day: int):
+    """ (date, None) for a valid travel day, or (None, error message for the LLM) """
+    try:
+        return date(year, month, day), None
+    except ValueError:
+        return None, f"Invalid travel date {year:04d}-{month:02d}-{day:02d}."
@@ -1,20 +1,25 @@
+import html
 import os
-import requests
-from models import SendEmail
+from models import SendEmail, SendTripEmail
+from tools.http_client import request_json
+from tools.outbox import Outbox
+from tools.trip_state import TripState
 
-def send_email(params: SendEmail):
+SENDGRID_BASE_URL = os.getenv("SENDGRID_BASE_URL") or "https://api.sendgrid.com"
+
+async def deliver_email(params: SendEmail):
     """
-    Send email.
+    Send email through SendGrid, raising on failure.
     """
 
     print("Sending email:", params)
 
     # Set the URL for the SendGrid API
-    url = "https://api.sendgrid.com/v3/mail/send"
+    url = f"{SENDGRID_BASE_URL}/v3/mail/send"
 
     # Create the headers
     headers = {
-        "Authorization": f"Bearer {os.getenv("SENDGRID_API_KEY")}",
+        "Authorization": f"Bearer {os.getenv('SENDGRID_API_KEY')}",
         "Content-Type": "application/json"
     }
 
@@ -29,14 +34,96 @@ def send_email(params: SendEmail):
         "subject": params.subject,
         "content": [
             {
-                "type": "text/plain",
+                "type": params.contentType,
                 "value": params.content
             }
         ]
     }
 
     # Send the POST request
-    response = requests.post(url, json=data, headers=headers)
-    response.raise_for_status()
-    return str(response.status_code)
+    # SendGrid answers 202 with an empty body, errors raise HttpError
+    # The outbox retries failed deliveries, so no retries here
+    await request_json("POST", url, json=data, headers=headers, retries=0,
+                       provider="sendgrid", phase="send")
+    return "202"
+
+
+outbox = Outbox(deliver_email)
+
+
+async def send_email(params: SendEmail):
+    """
+    Queue an email for background delivery and return at once.
+    """
+    message_id = outbox.enqueue(params)
+    return f"Email to {params.email} queued for delivery with id {message_id}."
+
+
+TRIP_EMAIL_SUBJECT = "Your TripMates trip summary"
+SECTION_TITLES = {
+    "flight": "Flights",
+    "hotel": "Hotels",
+    "event": "Events",
+}
+
+
+def render_trip_email(items) -> str:
+    """
+    HTML trip summary of the given TripItems, grouped into flights, hotels and events.
+    """
+    sections = []
+    for kind, section_title in SECTION_TITLES.items():
+        cards = []
+        for item in items:
+            if item.kind != kind:
+                continue
+            details = "".join(
+                f'<tr><td style="color:#666;padding-right:12px">{html.escape(label)}</td>'
+                f'<td>{html.escape(value)}</td></tr>'
+                for label, value in item.details
+            )
+            cards.append(
+                f'<div style="border:1px solid #ddd;border-radius:6px;padding:12px;margin:8px 0">'
+                f'<strong>{html.escape(item.title)}</strong><table style="margin-top:6px">{details}</table></div>'
+            )
+        if cards:
+            sections.append(f"<h2>{section_title}</h2>{''.join(cards)}")
+
+    return (
+        '<html><body style="font-family:Arial,sans-serif;color:#222;max-width:600px">'
+        '<h1>Your trip with TripMates</h1>'
+        f"{''.join(sections)}"
+        '<p style="color:#666">Prices were checked when you searched and may have changed since.</p>'
+        "</body></html>"
+    )
+
+
+async def send_trip_email(trip: TripState, params: SendTripEmail):
+    """
+    Render the trip summary from the session's trip state and queue it for delivery.
+    """
+    unknown = trip.pick(params.selection)
+    items = trip.selection()
+    if not items:
+        return "There is nothing to send yet, search flights, hotels or events first."
+
+    answer = await send_email(SendEmail(email=params.email, subject=TRIP_EMAIL_SUBJECT,
+                                        content=render_trip_email(items)))
+    if unknown:
+        answer += f" These IDs were not found and were left out: {', '.join(unknown)}."
+    return answer
+
+
+async def email_status(message_id: str):
+    """
+    Delivery status of a queued email.
+    """
+    message = outbox.status(message_id)
+    if message is None:
+        return f"No email with id {message_id} was queued by this session."
+    if message["status"] == "sent":
+        return f"Email {message_id} to {message['email']['email']} was delivered."
+    if message["status"] == "failed":
+        return f"Email {message_id} could not be delivered: {message['error']}"
+    return f"Email {message_id} is still pending after {message['attempts']} attempts."
 
@@ -0,0 +1,154 @@
+import asyncio
+import bisect
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from tools.locations import fold
+
+# Seconds a fetched date range stays fresh, like cached event answers
+EVENT_INDEX_TTL = 3600
+MAX_CITIES = 256
+# Start of activities that can be done any day
+ANY_DAY = ""
+
+
+@dataclass
+class IndexedEvent:
+    """An event, merged across every provider that lists it."""
+    key: tuple
+    name: str
+    venue: str | None  # None for activities, which aren't held at one venue
+    start: str  # ISO date or date-time, ANY_DAY when not tied to a date
+    sources: set = field(default_factory=set)
+
+
+def event_key(name: str, start: str) -> tuple:
+    """
+    Listings with the same folded name on the same day are one event; providers
+    name venues and time zones too differently to match on those.
+    """
+    return (fold(name), start[:10])
+
+
+def rank(events) -> list[IndexedEvent]:
+    """
+    Most relevant first: names more providers list in the range, then dated
+    events soonest first, then activities; ties broken by name so equal queries
+    rank equally. An activity also listed on a date is shown by its dated listings.
+    """
+    providers = {}
+    for event in events:
+        providers.setdefault(event.key[0], set()).update(event.sources)
+    dated = {event.key[0] for event in events if event.start != ANY_DAY}
+    shown = [event for event in events if event.start != ANY_DAY or event.key[0] not in dated]
+    return sorted(shown, key=lambda event: (
+        -len(providers[event.key[0]]), event.start == ANY_DAY, event.start, event.key
+    ))
+
+
+class CityEvents:
+    """
+    A city's events ordered by start, and the date ranges each provider was fetched for.
+
+    Ranges are half-open [first, end) days. A query only fetches the parts of
+    its range a provider hasn't answered for recently, so overlapping windows
+    are filled in instead of fetched again.
+    """
+
+    def __init__(self):
+        self.events = {}  # key -> IndexedEvent
+        self._starts = []  # sorted (start, key) of dated events
+        self._coverage = {}  # provider -> sorted, non-overlapping [(first, end, fetched_at)]
+        self._locks = {}  # provider -> asyncio.Lock
+
+    def lock(self, provider: str) -> asyncio.Lock:
+        """ Held while filling gaps, so concurrent queries don't fetch the same days twice """
+        if provider not in self._locks:
+            self._locks[provider] = asyncio.Lock()
+        return self._locks[provider]
+
+    def gaps(self, provider: str, first: date, end: date) -> list[tuple[date, date]]:
+        """ Parts of [first, end) provider hasn't been fetched for within the TTL """
+        now = time.time()
+        gaps = []
+        cursor = first
+        for covered_first, covered_end, fetched_at in self._coverage.get(provider, ()):
+            if now - fetched_at > EVENT_INDEX_TTL or covered_end <= cursor:
+                continue
+            if covered_first >= end:
+                break
+            if covered_first > cursor:
+                gaps.append((cursor, covered_first))
+            cursor = covered_end
+        if cursor < end:
+            gaps.append((cursor, end))
+        return gaps
+
+    def fill(self, provider: str, first: date, end: date, rows):
+        """ Replace what provider listed for [first, end) with its (venue or None, name, start) rows """
+        low, high = first.isoformat(), end.isoformat()
+        window = self._starts[bisect.bisect_left(self._starts, (low,)):bisect.bisect_left(self._starts, (high,))]
+        for _, key in window:
+            event = self.events[key]
+            event.sources.discard(provider)
+            if not event.sources:
+                self._remove(event)
+
+        for venue, name, start in rows:
+            # Some APIs answer with more than was asked for, only the fetched days are known to be complete
+            if start != ANY_DAY and not low <= start[:10] < high:
+                continue
+            key = event_key(name, start)
+            event = self.events.get(key)
+            if event is None:
+                event = self.events[key] = IndexedEvent(key, name, venue, start)
+                if start != ANY_DAY:
+                    bisect.insort(self._starts, (start, key))
+            event.venue = event.venue or venue
+            event.sources.add(provider)
+        self._cover(provider, first, end)
+
+    def _remove(self, event: IndexedEvent):
+        del self.events[event.key]
+        if event.start != ANY_DAY:
+            del self._starts[bisect.bisect_left(self._starts, (event.start, event.key))]
+
+    def _cover(self, provider: str, first: date, end: date):
+        kept = []
+        for covered_first, covered_end, fetched_at in self._coverage.get(provider, ()):
+            # Older ranges keep only the days outside the new one
+            if covered_first < first:
+                kept.append((covered_first, min(covered_end, first), fetched_at))
+            if covered_end > end:
+                kept.append((max(covered_first, end), covered_end, fetched_at))
+        kept.append((first, end, time.time()))
+        self._coverage[provider] = sorted(kept)
+
+    def between(self, first: date, end: date) -> list[IndexedEvent]:
+        """ Events starting in [first, end) by start, then the activities for any day """
+        low, high = first.isoformat(), end.isoformat()
+        window = self._starts[bisect.bisect_left(self._starts, (low,)):bisect.bisect_left(self._starts, (high,))]
+        dated = [self.events[key] for _, key in window]
+        return dated + [event for event in self.events.values() if event.start == ANY_DAY]
+
+
+class EventIndex:
+    """ Per-process event index of the most recently searched cities """
+
+    def __init__(self, max_cities: int = MAX_CITIES):
+        self.max_cities = max_cities
+        self._cities = OrderedDict()  # folded city name -> CityEvents
+
+    def city(self, name: str) -> CityEvents:
+        key = fold(name)
+        city = self._cities.get(key)
+        if city is None:
+            city = self._cities[key] = CityEvents()
+            while len(self._cities) > self.max_cities:
+                self._cities.popitem(last=False)
+        self._cities.move_to_end(key)
+        return city
+
+
+event_index = EventIndex()
@@ -1,149 +1,218 @@
-import requests
-from datetime import datetime, timedelta
-from amadeus import Client, ResponseError
-import random
+import asyncio
+import functools
+from datetime import date, timedelta
 from models import SearchEventRequest
+from tools.http_client import request_json, HttpError
+from tools.cache import cached_search
+from tools.results import ResultTable
+from tools.reference import city_geocode
+from tools.amadeus_auth import AMADEUS_BASE_URL, amadeus_headers, get_token_manager
+from tools.resilience import provider_unavailable
+from tools.trip_state import trip_item
+from tools.progress import report_partial
+from tools.event_index import ANY_DAY, CityEvents, event_index, rank
 import os
 
-def format_date(year: int, month: int, day: int) -> str:
-    return f"{year:04d}-{month:02d}-{day:02d}"
+TICKETMASTER_BASE_URL = os.getenv("TICKETMASTER_BASE_URL") or "https://app.ticketmaster.com"
 
+# Seconds each provider gets before search_events answers without it
+DEFAULT_PROVIDER_DEADLINE = 4.0
+PARTIAL_NOTE = "did not answer in time"
+UNAVAILABLE_NOTE = "unavailable right now"
+NO_EVENTS = "No events found for these dates."
+EVENTS_UNAVAILABLE = f"Events are {UNAVAILABLE_NOTE}, please try again in a minute."
 
-def find_events_ticket_master(location:str, year:int, month:int, day:int):
-    """
-    Fetches events from Eventbrite, Ticketmaster, and Meetup based on location and date.
-
-    Parameters:
-    - location (str): The city or region to search events in.
-    - date_str (str): The date in 'YYYY-MM-DD' format.
+# Events listed per answer, the index ranks them and more_results pages through them
+EVENT_MAX_RESULTS = 40
+MAX_EVENT_DAYS = 14
+TICKETMASTER_PAGE_SIZE = 200
 
-    Returns:
-    - List of events with details.
-    """
-    events = []
+# name -> (provider coroutine function, deadline in seconds, upstream provider)
+EVENT_PROVIDERS = {}
 
-    try:
-        date_obj = datetime.strptime(format_date(year,month,day), '%Y-%m-%d')
-    except ValueError:
-        print("Invalid date format. Please use 'YYYY-MM-DD'.")
-        return events
 
-    # Define date range: date ± 3 days
-    start_date = date_obj.isoformat()
-    end_date = (date_obj + timedelta(days=5)).isoformat()
+def event_provider(name: str, upstream: str, deadline: float = DEFAULT_PROVIDER_DEADLINE):
+    """
+    Register an async `provider(location, first, end)` returning (venue or None, name, start) rows for
+    the days [first, end). It should raise on errors, an empty answer marks the days as done.
 
-    api_key = os.getenv('TICKETMASTER_API_KEY')
+    `upstream` names the API it calls, so it is skipped while that API's circuit is open.
+    """
+    def decorator(fn):
+        EVENT_PROVIDERS[name] = (fn, deadline, upstream)
+        return fn
+    return decorator
 
-    try:
-        tm_url = 'https://app.ticketmaster.com/discovery/v2/events.json'
-        tm_params = {
-            'apikey': api_key,
-            'city': location,
-            'startDateTime': f"{start_date}Z",
-            'endDateTime': f"{end_date}Z"
-        }
-        tm_response = requests.get(tm_url, params=tm_params)
-        if tm_response.status_code == 200:
-            tm_data = tm_response.json()
-            for event in tm_data.get('_embedded', {}).get('events', []):
-                events.append({
-                    'name': event['name'],
-                    'start': event['dates']['start'].get('dateTime', ''),
-                    'venue': event['_embedded']['venues'][0]['name'],
-                    'url': event['url'],
-                    'source': 'Ticketmaster'
-                })
-        else:
-            print(f"Ticketmaster API error: {tm_response.status_code}")
-    except Exception as e:
-        print(f"Error fetching Ticketmaster events: {e}")
-    all_events = []
-    if len(events) < 20:
-        all_events = events
-    else: 
-        all_events = random.sample(events, 20)
-    lines = []
-    for event in all_events:
-        lines.append(f"| {event['venue']} | {event['name']} | {event['start']}")
 
-    return lines
+def format_date(year: int, month: int, day: int) -> str:
+    return f"{year:04d}-{month:02d}-{day:02d}"
 
 
-def find_events_amadeus(location: str, year: int, month: int, day: int):
+@event_provider("Ticketmaster", "ticketmaster")
+async def find_events_ticket_master(location: str, first: date, end: date):
     """
-    Finds events near a given location starting from a specific date
-    and over the following 4 days using the Amadeus API.
+    Fetches Ticketmaster events in a city starting on the days [first, end).
 
-    Args:
-        location (str): The name of the city or place.
-        year (int): Start year.
-        month (int): Start month.
-        day (int): Start day.
+    Returns:
+    - (venue, name, start) rows, ordered by date.
+    """
+    tm_url = f'{TICKETMASTER_BASE_URL}/discovery/v2/events.json'
+    tm_params = {
+        'apikey': os.getenv('TICKETMASTER_API_KEY'),
+        'city': location,
+        'startDateTime': f"{first.isoformat()}T00:00:00Z",
+        'endDateTime': f"{end.isoformat()}T00:00:00Z",
+        'sort': 'date,asc',
+        'size': TICKETMASTER_PAGE_SIZE,
+    }
+    tm_data = await request_json("GET", tm_url, params=tm_params,
+                                 provider="ticketmaster", phase="events") or {}
+    rows = []
+    for event in tm_data.get('_embedded', {}).get('events', []):
+        try:
+            start = event['dates']['start']
+            rows.append((
+                event['_embedded']['venues'][0]['name'],
+                event['name'],
+                start.get('dateTime') or start['localDate'],
+            ))
+        except (KeyError, IndexError):
+            print(f"Skipping incomplete Ticketmaster event {event.get('id')}")
+    return rows
+
+
+@event_provider("Amadeus", "amadeus")
+async def find_events_amadeus(location: str, first: date, end: date):
+    """
+    Finds activities near a city bookable on the days [first, end) using the Amadeus API.
 
     Returns:
-        List of events (or empty list if none or error).
+        (None, name, ANY_DAY) rows, activities aren't tied to a venue or a date.
     """
-    client_id = os.getenv('AMADEUS_API_KEY')
-    client_secret = os.getenv('AMADEUS_API_SECRET')
+    headers = await amadeus_headers()
+    if headers is None:
+        raise HttpError(401, AMADEUS_BASE_URL, "No Amadeus access token")
 
-    amadeus = Client(
-        client_id=client_id,
-        client_secret=client_secret
-    )
+    geo = await city_geocode(location)
+    if geo is None:
+        print(f"No location found for '{location}'")
+        return []
+    latitude, longitude = geo
 
     try:
-        # Step 1: Get coordinates of the location
-        location_response = amadeus.reference_data.locations.get(
-            keyword=location,
-            subType='CITY'
-        )
-        if not location_response.data:
-            print(f"No location found for '{location}'")
-            return []
-
-        geo = location_response.data[0]['geoCode']
-        latitude = geo['latitude']
-        longitude = geo['longitude']
-
-        # Step 2: Format dates
-        start_date = datetime(year, month, day)
-        end_date = start_date + timedelta(days=4)
-        start_str = format_date(year, month, day)
-        end_str = end_date.strftime('%Y-%m-%d')
-
-        # Step 3: Search for events
-        event_response = amadeus.shopping.activities.get(
-            latitude=latitude,
-            longitude=longitude,
-            radius=10,  # km
-            startDate=start_str,
-            endDate=end_str
-        )
-        all_events = []
-        if len(event_response.data) < 20:
-            all_events = event_response.data
-        else: 
-            all_events = random.sample(event_response.data, 20)
-        
-        lines = []
-        for event in all_events:
-            lines.append(f"| {event['id']} | {event['name']} | {start_str}")
-
-        return lines
-
-    except ResponseError as e:
-        print(f"Amadeus API error: {e}")
-        return []
-    
+        event_response = await request_json(
+            "GET",
+            f"{AMADEUS_BASE_URL}/v1/shopping/activities",
+            headers=headers,
+            provider="amadeus",
+            phase="activities",
+            params={
+                'latitude': latitude,
+                'longitude': longitude,
+                'radius': 10,  # km
+                'startDate': first.isoformat(),
+                'endDate': (end - timedelta(days=1)).isoformat(),
+            }
+        ) or {}
+    except HttpError as e:
+        if e.status == 401:
+            get_token_manager().invalidate()
+        raise
+    return [(None, event['name'], ANY_DAY) for event in event_response.get('data', [])]
+
+
+async def _fill_from_provider(name: str, provider, deadline: float, city: CityEvents,
+                              params: SearchEventRequest, first: date, end: date):
+    """
+    Fetch the days of [first, end) the index lacks from one provider under its deadline.
+
+    Returns True when the index now covers the range for it, None if it was too slow,
+    False if it failed.
+    """
+    async def fill():
+        async with city.lock(name):
+            for gap_first, gap_end in city.gaps(name, first, end):
+                city.fill(name, gap_first, gap_end, await provider(params.location, gap_first, gap_end))
 
-def search_events(params: SearchEventRequest):
-    lines = []
-    lines.append("## Event Options")
-    lines.append("| Venue | description | Date |")
-    lines.append("|-----------|-------|------|")
-    lines = lines + find_events_amadeus(params.location, params.year,params.month,params.day)
-    lines = lines + find_events_ticket_master(params.location, params.year,params.month,params.day)
+    try:
+        await asyncio.wait_for(fill(), deadline)
+        return True
+    except asyncio.TimeoutError:
+        print(f"Event provider {name} {PARTIAL_NOTE} ({deadline}s)")
+        return None
+    except Exception as e:
+        print(f"Event provider {name} failed: {e!r}")
+        return False
+
+
+def format_event_results(events, params: SearchEventRequest, notes) -> ResultTable:
+    """ Indexed events, most relevant first, every event with an item ID the user can pick for the trip summary email """
+    rows = []
+    for event in rank(events)[:EVENT_MAX_RESULTS]:
+        when = event.start or "Any day"
+        venue = event.venue or "-"
+        # The catalog is shared by every session, and names alone repeat across cities
+        item_id = trip_item("event", (params.location, *event.key), event.name,
+                            (("Venue", venue), ("Date", when), ("City", params.location)))
+        rows.append((item_id, venue, event.name, when))
+    return ResultTable("events", "Event Options", ("ID", "Venue", "Event", "Date"), rows, notes)
+
+
+# Only cache complete answers with at least one event, the others are plain messages or carry a note
+@cached_search("events", cacheable=lambda result: isinstance(result, ResultTable) and not any(
+    PARTIAL_NOTE in note or UNAVAILABLE_NOTE in note for note in result.notes
+))
+async def search_events(params: SearchEventRequest):
+    """
+    Answer from the city's event index, first filling in the days each provider
+    hasn't been asked about yet. Providers run concurrently; the ones missing
+    their deadline are left out and noted.
+    """
+    names = []
+    unavailable = []
+    for name, (_, _, upstream) in EVENT_PROVIDERS.items():
+        (unavailable if provider_unavailable(upstream) else names).append(name)
+    if not names:
+        return EVENTS_UNAVAILABLE
 
-    events = "\n".join(lines)
+    try:
+        first = date(params.year, params.month, params.day)
+    except ValueError:
+        return f"Invalid travel date {format_date(params.year, params.month, params.day)}."
+    end = first + timedelta(days=max(1, min(params.days, MAX_EVENT_DAYS)))
+    city = event_index.city(params.location)
+
+    pending = {
+        asyncio.create_task(_fill_from_provider(name, *EVENT_PROVIDERS[name][:2], city, params, first, end)): name
+        for name in names
+    }
+    results = {}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results[pending.pop(task)] = task.result()
+            so_far = city.between(first, end)
+            if pending and so_far:
+                # Lets a slow search speak the events found so far
+                report_partial(functools.partial(
+                    format_event_results, so_far, params, [f"Still waiting for {', '.join(pending.values())}."]
+                ))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    late = [name for name in names if results.get(name) is None]
+    failed = [name for name in names if results.get(name) is False]
+    notes = []
+    if late:
+        notes.append(f"{', '.join(late)} {PARTIAL_NOTE}, so some events may be missing.")
+    if unavailable or failed:
+        notes.append(f"{', '.join(unavailable + failed)} {UNAVAILABLE_NOTE}, so some events may be missing.")
+    found = city.between(first, end)
+    if not found and not late:
+        return EVENTS_UNAVAILABLE if unavailable or failed else NO_EVENTS
+
+    events = format_event_results(found, params, notes)
     print(events)
     return events
@@ -1,21 +1,50 @@
-from models import SearchFlightRequest
-import requests
+from models import SearchFlightRequest, SearchGroupFlightsRequest, SearchFlightCalendarRequest
+from tools.http_client import request_json, HttpError, REQUEST_ERRORS
+from tools.cache import cached_search
+from datetime import timedelta
+from tools.quotes import QuoteTable, PriceCalendar, IndicativeQuotesExtractor, FLIGHT_DAY_WINDOW, FLIGHT_TOP_K, FLIGHT_MAX_RESULTS
+from tools.results import render_result
+from tools.resilience import provider_unavailable
+from tools.trip_state import trip_item
+from tools.dates import travel_date
+import numpy as np
+import asyncio
 import os
-import re
 
-def search_flights(params: SearchFlightRequest):
+SKYSCANNER_BASE_URL = os.getenv("SKYSCANNER_BASE_URL") or "https://partners.api.skyscanner.net"
+SKYSCANNER_INDICATIVE_URL = f"{SKYSCANNER_BASE_URL}/apiservices/v3/flights/indicative/search"
+
+# Concurrent Skyscanner queries a single group search may have in flight
+GROUP_SEARCH_CONCURRENCY = 6
+# Extra euros a non-direct leg adds to a destination's group score
+INDIRECT_PENALTY = 25.0
+FLIGHTS_UNAVAILABLE = "Flight search is unavailable right now, please try again in a minute."
+
+
+async def fetch_indicative_quotes(params: SearchFlightRequest):
     """
-    Search for flights using the Skyscanner API.
+    Skyscanner indicative quotes for one route over the whole month.
+
+    An empty destinationIata searches "anywhere". Returns IndicativeQuotes, or None on failure.
     """
-    api_key = os.getenv("SKYSCANNER_API_KEY")
+    # The response covers the whole month, so every day shares one cache entry
+    return await _fetch_month_quotes(params.model_copy(update={"day": 1}))
 
-    url = "https://partners.api.skyscanner.net/apiservices/v3/flights/indicative/search"
+
+@cached_search("flights")
+async def _fetch_month_quotes(params: SearchFlightRequest):
+    api_key = os.getenv("SKYSCANNER_API_KEY")
 
     headers = {
         "x-api-key": api_key,
         "Content-Type": "application/json"
     }
 
+    if params.destinationIata:
+        destination = {"queryPlace": {"iata": params.destinationIata}}
+    else:
+        destination = {"anywhere": True}
+
     payload = {
         "query": {
             "market": params.market,
@@ -28,11 +57,7 @@ def search_flights(params: SearchFlightRequest):
                             "iata": params.originIata
                         }
                     },
-                    "destinationPlace": {
-                        "queryPlace": {
-                            "iata": params.destinationIata
-                        }
-                    },
+                    "destinationPlace": destination,
                     "dateRange": {
                         "startDate": {
                             "year": params.year,
@@ -50,64 +75,224 @@ def search_flights(params: SearchFlightRequest):
     }
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
-
-        response.raise_for_status()
-        flights = format_flight_results(response.json())
-        print(flights)
-        return flights
-
-    except requests.exceptions.HTTPError as e:
+        # The indicative search only reads, so it is safe to hedge despite being a POST.
+        # Month-wide answers are large, only the quote fields the tools use are kept
+        return await request_json("POST", SKYSCANNER_INDICATIVE_URL, headers=headers, json=payload,
+                                  provider="skyscanner", phase="indicative", hedge=True,
+                                  extract=IndicativeQuotesExtractor)
+    except HttpError as e:
         print(f"HTTP Error: {e}")
-        print(f"Response: {response.text if 'response' in locals() else 'No response'}")
-    except requests.exceptions.ConnectionError as e:
-        print(f"Connection Error: {e}")
-    except requests.exceptions.Timeout as e:
-        print(f"Timeout Error: {e}")
-    except requests.exceptions.RequestException as e:
-        print(f"Request Exception: {e}")
+        print(f"Response: {e.body}")
+    except REQUEST_ERRORS as e:
+        print(f"Request Exception: {e!r}")
 
     return None
 
 
-def format_flight_results(results):
+async def search_flights(params: SearchFlightRequest):
+    """
+    Search for flights using the Skyscanner API.
+    """
+    target, error = travel_date(params.year, params.month, params.day)
+    if error:
+        return error
+    results = await fetch_indicative_quotes(params)
+    if results is None:
+        return FLIGHTS_UNAVAILABLE if provider_unavailable("skyscanner") else None
+
+    route = f"{params.originIata.strip().upper()} to {(params.destinationIata or 'anywhere').strip().upper()}"
+    flights = format_flight_results(results, target, route=route,
+                                    currency=params.currency)
+    print(flights)
+    return flights
+
+
+@cached_search("flight_calendar")
+async def _month_calendar(params: SearchFlightRequest):
+    """ Per-day fare grid of one route and month, built from a single indicative search """
+    results = await fetch_indicative_quotes(params)
+    if results is None:
+        return None
+    return PriceCalendar.from_table(QuoteTable.from_quotes(results), params.year, params.month)
+
+
+async def search_price_calendar(params: SearchFlightCalendarRequest):
+    """
+    Cheapest and cheapest direct fare for each day around the travel day.
+
+    Answered from the cached month grid; the adjacent month is only fetched
+    when the window crosses a month boundary.
+    """
+    target, error = travel_date(params.year, params.month, params.day)
+    if error:
+        return error
+    days = [target + timedelta(days=offset) for offset in range(-params.windowDays, params.windowDays + 1)]
+    months = sorted({(day.year, day.month) for day in days})
+
+    calendars = await asyncio.gather(*(_month_calendar(SearchFlightRequest(
+        originIata=params.originIata,
+        destinationIata=params.destinationIata,
+        year=year,
+        month=month,
+        day=1,
+        market=params.market,
+        locale=params.locale,
+        currency=params.currency,
+    )) for year, month in months))
+    by_month = dict(zip(months, calendars))
+
+    rows = []
+    best = None
+    for day in days:
+        grid = by_month[(day.year, day.month)]
+        if grid is None:
+            continue
+        cheapest, cheapest_direct = grid.fares(day.day)
+        if np.isinf(cheapest):
+            continue
+        offset = (day - target).days
+        rows.append((
+            str(day),
+            f"{offset:+d}" if offset else "0",
+            cheapest,
+            "-" if np.isinf(cheapest_direct) else cheapest_direct,
+        ))
+        if best is None or cheapest < best[1]:
+            best = (day, cheapest)
+
+    if not rows:
+        if provider_unavailable("skyscanner"):
+            return FLIGHTS_UNAVAILABLE
+        return f"No fares found within {params.windowDays} days of {target}."
+
+    notes = [f"Cheapest day: {best[0]} at {best[1]:.0f} {params.currency}."]
+    title = f"Price Calendar {params.originIata}-{params.destinationIata} ({params.currency})"
+    return render_result("flights", title, ("Date", "Offset", "Cheapest", "Direct"), rows, notes)
+
+
+def cheapest_by_destination(results, target, window: int = FLIGHT_DAY_WINDOW) -> dict:
+    """
+    Cheapest quote per destination IATA code within `window` days of `target`: {iata: (price, is_direct)}.
+    """
+    if results is None:
+        return {}
+    table = QuoteTable.from_quotes(results)
+    ranked = table.rank(target, window, top_k=len(table))
+    cheapest = {}
+    for i in range(len(ranked)):
+        iata = results.places.get(ranked.destination_ids[i])
+        if not iata:
+            continue
+        if iata not in cheapest or ranked.price[i] < cheapest[iata][0]:
+            cheapest[iata] = (ranked.price[i], bool(ranked.direct[i]))
+    return cheapest
+
+
+async def search_group_flights(params: SearchGroupFlightsRequest):
+    """
+    Find the best meeting point for a group flying from several origins.
+
+    Runs every origin x destination indicative search concurrently, keeps the
+    destinations every origin can reach within a few days of the travel day and
+    ranks them by group fare. A friend's home city costs them nothing.
+    """
+    target, error = travel_date(params.year, params.month, params.day)
+    if error:
+        return error
+    origins = [iata.strip().upper() for iata in params.originIatas]
+    destinations = [iata.strip().upper() for iata in params.destinationIatas] or [""]
+    semaphore = asyncio.Semaphore(GROUP_SEARCH_CONCURRENCY)
+
+    async def route(origin: str, destination: str):
+        async with semaphore:
+            results = await fetch_indicative_quotes(SearchFlightRequest(
+                originIata=origin,
+                destinationIata=destination,
+                year=params.year,
+                month=params.month,
+                day=params.day,
+                market=params.market,
+                locale=params.locale,
+                currency=params.currency,
+            ))
+        return origin, cheapest_by_destination(results, target)
+
+    routes = await asyncio.gather(*(route(o, d) for o in origins for d in destinations if o != d))
+
+    # fares[destination][origin] = (price, is_direct)
+    fares = {destination: {} for destination in destinations if destination in origins}
+    for origin, cheapest in routes:
+        for destination, fare in cheapest.items():
+            current = fares.setdefault(destination, {}).get(origin)
+            if current is None or fare[0] < current[0]:
+                fares[destination][origin] = fare
+    for destination, by_origin in fares.items():
+        if destination in origins:
+            by_origin[destination] = (0.0, True)
+
+    ranked = []
+    for destination, by_origin in fares.items():
+        if len(by_origin) < len(set(origins)):
+            continue
+        prices = [by_origin[origin][0] for origin in origins]
+        indirect = sum(1 for origin in origins if not by_origin[origin][1])
+        fare = max(prices) if params.rankBy == "max" else sum(prices)
+        ranked.append((fare + INDIRECT_PENALTY * indirect, destination, sum(prices), max(prices), indirect, by_origin))
+    ranked.sort(key=lambda row: (row[0], row[1]))
+
+    if not ranked:
+        if provider_unavailable("skyscanner"):
+            return FLIGHTS_UNAVAILABLE
+        return f"No destination found that every origin can reach within {FLIGHT_DAY_WINDOW} days of {target}."
+
+    rows = []
+    for _, destination, total, highest, indirect, by_origin in ranked:
+        per_origin = ", ".join(f"{origin} {by_origin[origin][0]:.0f}" for origin in origins)
+        rows.append((destination, total, highest, f"{len(origins) - indirect}/{len(origins)}", per_origin))
+
+    group_flights = render_result(
+        "group_flights",
+        f"Group Destinations ({params.currency}, ranked by {params.rankBy} fare)",
+        ("Destination", "Total", "Max", "Direct", "Fares"),
+        rows,
+        max_rows=params.limit,
+    )
+    print(group_flights)
+    return group_flights
+
+
+def format_flight_results(results, target=None, window: int = FLIGHT_DAY_WINDOW, top_k: int = FLIGHT_TOP_K,
+                          route: str = "", currency: str = "EUR"):
     """
     Format flight search results for better LLM understanding
+
+    The best `top_k` quotes within `window` days of `target` are listed, the
+    next ones up to FLIGHT_MAX_RESULTS stay available through more_results.
+    Every quote listed or paged gets an item ID the user can pick for the trip
+    summary email.
     """
     
     if results is None:
         return "No results found."
     
-    lines = []
-    
-    lines.append("## Flight Options")
-    lines.append("| Flight ID | Price | Direct | Date |")
-    lines.append("|-----------|-------|--------|------|")
-    
-    quotes = results.get("content", {}).get("results", {}).get("quotes", {})
+    table = QuoteTable.from_quotes(results)
 
-    if not quotes:
+    if not len(table):
         return "No flight options found for these dates."
-    
-    for identifier, quote in quotes.items():
-        price = quote.get("minPrice", {}).get("amount", "N/A")
-        is_direct = "Yes" if quote.get("isDirect", False) else "No"
-        
-        departure = quote.get("outboundLeg", {}).get("departureDateTime", {})
-        year = departure.get("year", "N/A")
-        month = departure.get("month", "N/A")
-        day = departure.get("day", "N/A")
-        
-        date = f"{year}-{month:02d}-{day:02d}" if isinstance(year, int) else "N/A"
-        
-        airline_match = re.search(r'\*([a-z]+)\*([A-Z]{2,})', identifier)
-        if airline_match:
-            airline_name = airline_match.group(1)  # e.g., 'leve', 'skyp', 'iber'
-            airline_code = airline_match.group(2)  # e.g., 'LL', 'IB', 'FR'
-            airline_info = f"{airline_name}-{airline_code}"
-        else:
-            airline_info = identifier
-        
-        lines.append(f"| {airline_info} | {price} | {is_direct} | {date} |")
-    
-    return "\n".join(lines)
+
+    ranked = table.rank(target, window, top_k=max(top_k, FLIGHT_MAX_RESULTS))
+    if not len(ranked):
+        return f"No flight options found within {window} days of {target}."
+
+    rows = []
+    for i in range(len(ranked)):
+        is_direct = "Yes" if ranked.direct[i] else "No"
+        date = "N/A" if np.isnat(ranked.date[i]) else str(ranked.date[i])
+        airline = ranked.airline(i)
+        item_id = trip_item("flight", (route, ranked.ids[i], ranked.price[i]), f"Flight {route}", (
+            ("Airline", airline), ("Date", date), ("Price", f"{ranked.price[i]:.0f} {currency}"), ("Direct", is_direct),
+        ))
+        rows.append((item_id, airline, ranked.price[i], is_direct, date))
+
+    return render_result("flights", "Flight Options", ("ID", "Airline", "Price", "Direct", "Date"), rows,
+                         max_rows=top_k)
@@ -1,97 +1,159 @@
 from typing import List
+import asyncio
+import functools
 from models import SearchHotelRequest
-from amadeus import Client
-import os
-import requests
+from tools.http_client import request_json, HttpError, REQUEST_ERRORS
+from tools.amadeus_auth import AMADEUS_BASE_URL, amadeus_headers, get_token_manager
+from tools.cache import cached_search
+from tools.reference import city_hotel_ids
+from tools.results import ResultTable
+from tools.resilience import provider_unavailable
+from tools.trip_state import trip_item
+from tools.progress import report_partial
+from tools.dates import travel_date
+
+NO_HOTELS = "No hotel data available."
+HOTELS_UNAVAILABLE = "Hotel search is not available right now."
+
+# Hotel IDs per hotel-offers request, and how many of those requests run at once
+HOTEL_CHUNK_SIZE = 20
+HOTEL_SEARCH_CONCURRENCY = 4
+# Stop searching further chunks once this many offers arrived or the deadline passed
+HOTEL_TARGET_OFFERS = 40
+HOTEL_SEARCH_DEADLINE = 6.0
+HOTEL_TOP_K = 8
+
+
+def offer_price(hotel_data) -> float:
+    """ Total price of a hotel's best offer, infinite when missing """
+    try:
+        return float(hotel_data.get('offers', [{}])[0].get('price', {}).get('total'))
+    except (TypeError, ValueError):
+        return float('inf')
 
 
-def get_access_token(client_id, client_secret):
-    """
-    Obtain an access token from the Amadeus API.
+def format_hotel_results(hotels, searched: int = 0, total: int = 0):
     """
-    url = "https://test.api.amadeus.com/v1/security/oauth2/token"
-    headers = { "Content-Type": "application/x-www-form-urlencoded" }
-    data = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret
-    }
+    Format hotel offers, cheapest first, as a compact table within the hotels budget.
 
-    try:
-        response = requests.post(url, headers=headers, data=data)
-        response.raise_for_status() 
-        return response.json().get("access_token")
-    except requests.exceptions.RequestException as e:
-        print(f"Request error: {e}")
-    except ValueError:
-        print("Error parsing the response JSON.")
-    return None
-
-def format_hotel_results(data):
-    """
-    Format hotel search results as a Markdown table.
+    Every offer gets an item ID the user can pick for the trip summary email.
     """
-    if not data or 'data' not in data:
-        return "No hotel data available."
-    
-    # Start building the markdown table
-    md_table = "# Hotel Options\n\n"
-    md_table += "| Hotel Name | Hotel Type | Chain Code | Price | Room Description |\n"
-    md_table += "|------------|------------|------------|-------|------------------|\n"
-    
-    for hotel_data in data.get('data', []):
+    if not hotels:
+        return NO_HOTELS
+
+    rows = []
+    for hotel_data in sorted(hotels, key=offer_price):
         hotel_type = hotel_data.get('hotel', {}).get('type', 'Unknown Type')
         hotel_name = hotel_data.get('hotel', {}).get('name', 'Unknown Hotel')
         chain_code = hotel_data.get('hotel', {}).get('chainCode', 'Unknown Chain')
-            
+
         currency = hotel_data.get('offers', [{}])[0].get('price', {}).get('currency', 'Unknown Currency')
         price = hotel_data.get('offers', [{}])[0].get('price', {}).get('total', 'Unknown Price')
 
         description = hotel_data.get('offers', [{}])[0].get('room', {}).get('description', {}).get('text', 'Unknown Description')
 
-        md_table += f"| {hotel_name} | {hotel_type} | {chain_code} | {price} {currency} | {description} |\n"
-    
-    return md_table
-
-
-def get_hotel_list(client_id:str, client_secret:str, cityCode:str) -> List[str]:
-    """ Get a list of hotel IDs for a given city code """
-    amadeus = Client(
-        client_id=client_id,
-        client_secret=client_secret
-    )
-    response = amadeus.reference_data.locations.hotels.by_city.get(cityCode=cityCode)
-    return [hotel['hotelId'] for hotel in response.data]
-
+        offer = hotel_data.get('offers', [{}])[0]
+        item_id = trip_item("hotel", (hotel_data.get('hotel', {}).get('hotelId'), offer.get('id'), price), hotel_name, (
+            ("Check-in", offer.get('checkInDate', '-')),
+            ("Check-out", offer.get('checkOutDate', '-')),
+            ("Price", f"{price} {currency}"),
+            ("Room", description),
+        ))
+        rows.append((item_id, hotel_name, hotel_type, chain_code, f"{price} {currency}", description))
 
-def search_hotels(params: SearchHotelRequest):
-    """
-    Search for hotels using the API.
-    """
-    client_id=os.getenv("AMADEUS_API_KEY")
-    client_secret=os.getenv("AMADEUS_API_SECRET")
+    notes = []
+    if searched < total:
+        notes.append(f"Compared offers from {searched} of the {total} hotels in the city.")
+    return ResultTable("hotels", "Hotel Options", ("ID", "Hotel", "Type", "Chain", "Price", "Room"), rows,
+                       notes, max_rows=HOTEL_TOP_K)
 
-    hotelIds = get_hotel_list(client_id, client_secret, params.locationIata)[:15]
 
-    access_token = get_access_token(client_id, client_secret)
+async def get_hotel_list(cityCode:str) -> List[str]:
+    """ Get a list of hotel IDs for a given city code """
+    return await city_hotel_ids(cityCode)
 
-    formated_date = f"{params.year}-{params.month}-{params.day}" if params.month > 9 else f"{params.year}-0{params.month}-{params.day}"
 
-    url = 'https://test.api.amadeus.com/v3/shopping/hotel-offers'
-    params = {
+async def get_hotel_offers(headers: dict, hotelIds: List[str], params: SearchHotelRequest) -> list:
+    """ Best offer of each hotel in one chunk of hotel IDs, or [] on error """
+    url = f'{AMADEUS_BASE_URL}/v3/shopping/hotel-offers'
+    query = {
         'hotelIds': hotelIds,
         'adults': params.adults,
-        'checkInDate': formated_date,
+        'checkInDate': f"{params.year:04d}-{params.month:02d}-{params.day:02d}",
         'bestRateOnly': 'true',
         'currency': 'EUR'
     }
-    headers = {
-        'Authorization': f'Bearer {access_token}'
-    }
+    try:
+        offers = await request_json("GET", url, headers=headers, params=query,
+                                    provider="amadeus", phase="hotel_offers")
+    except HttpError as e:
+        if e.status == 401:
+            get_token_manager().invalidate()
+        print(f"Amadeus hotel offers error: {e}")
+        print(f"Response: {e.body}")
+        return []
+    except REQUEST_ERRORS as e:
+        print(f"Amadeus hotel offers error: {e!r}")
+        return []
+    return [hotel for hotel in (offers or {}).get('data', []) if hotel.get('available', True)]
+
+
+@cached_search("hotels", cacheable=lambda result: result not in (NO_HOTELS, HOTELS_UNAVAILABLE))
+async def search_hotels(params: SearchHotelRequest):
+    """
+    Search for hotels using the API.
 
-    offers_response = requests.get(url, headers=headers, params=params)
-    offers_response.raise_for_status()
+    The city's hotel list is split into chunks searched concurrently. Offers
+    are merged as chunks finish, and the search stops once enough offers have
+    arrived or the deadline passes.
+    """
+    _, error = travel_date(params.year, params.month, params.day)
+    if error:
+        return error
+    if provider_unavailable("amadeus"):
+        return HOTELS_UNAVAILABLE
+    headers = await amadeus_headers()
+    if headers is None:
+        return HOTELS_UNAVAILABLE
 
-    hotels = format_hotel_results(offers_response.json())
+    try:
+        hotelIds = await get_hotel_list(params.locationIata)
+    except REQUEST_ERRORS as e:
+        print(f"Amadeus hotel list error: {e!r}")
+        return HOTELS_UNAVAILABLE if provider_unavailable("amadeus") else NO_HOTELS
+    if not hotelIds:
+        return NO_HOTELS
+
+    chunks = [hotelIds[i:i + HOTEL_CHUNK_SIZE] for i in range(0, len(hotelIds), HOTEL_CHUNK_SIZE)]
+    semaphore = asyncio.Semaphore(HOTEL_SEARCH_CONCURRENCY)
+
+    async def search_chunk(chunk):
+        async with semaphore:
+            return len(chunk), await get_hotel_offers(headers, chunk, params)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + HOTEL_SEARCH_DEADLINE
+    pending = {asyncio.create_task(search_chunk(chunk)) for chunk in chunks}
+    hotels = []
+    searched = 0
+    try:
+        while pending and len(hotels) < HOTEL_TARGET_OFFERS:
+            done, pending = await asyncio.wait(pending, timeout=max(deadline - loop.time(), 0),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                print(f"Hotel search deadline reached after {searched} of {len(hotelIds)} hotels")
+                break
+            for task in done:
+                chunk_size, offers = task.result()
+                searched += chunk_size
+                hotels.extend(offers)
+            if pending and hotels:
+                # Lets a slow search speak the offers found so far
+                report_partial(functools.partial(format_hotel_results, list(hotels), searched, len(hotelIds)))
+    finally:
+        for task in pending:
+            task.cancel()
+
+    hotels = format_hotel_results(hotels, searched, len(hotelIds))
     print(hotels)
     return hotels
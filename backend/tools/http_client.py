@@ -0,0 +1,282 @@
+import asyncio
+import json as _json
+import os
+import random
+import time
+import weakref
+import aiohttp
+import ijson
+from tools.tracing import span
+from tools.ratelimit import get_limiter
+from tools.resilience import CircuitOpenError, get_breaker, get_latency, deadline_for, hedged
+
+# Pool and timeout settings shared by every tool in this worker process
+POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT") or "100")
+POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST") or "10")
+KEEPALIVE_TIMEOUT = 30
+TIMEOUT = aiohttp.ClientTimeout(total=20, connect=5, sock_read=15)
+
+# Bodies up to STREAM_MIN_BYTES parse faster whole; bigger ones are parsed in chunks as they arrive.
+# Once an extractor has enough, a remainder up to DRAIN_LIMIT is still read to keep the connection
+STREAM_MIN_BYTES = 256 * 1024
+STREAM_CHUNK_SIZE = 16 * 1024
+DRAIN_LIMIT = 64 * 1024
+
+# Seconds a call may wait in our own rate limiter before its first attempt is sent
+QUEUE_WAIT_MAX = 10.0
+
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.3
+BACKOFF_MAX = 4.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# One session per event loop; LiveKit runs one loop per job process
+_sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+
+
+class HttpError(Exception):
+    """Raised when an upstream API answers with a non-2xx status, or a 2xx body that isn't JSON."""
+
+    def __init__(self, status: int, url: str, body: str):
+        super().__init__(f"{status} error from {url}")
+        self.status = status
+        self.url = url
+        self.body = body
+
+
+# Errors the tools catch to degrade gracefully instead of failing the turn
+REQUEST_ERRORS = (HttpError, CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Return the pooled keep-alive session for the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=POOL_LIMIT,
+            limit_per_host=POOL_LIMIT_PER_HOST,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=300,
+        )
+        session = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT)
+        _sessions[loop] = session
+    return session
+
+
+async def close_session():
+    """
+    Close the session of the running event loop, if any.
+    """
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def _clean_params(params):
+    """Drop empty values and join lists the way the upstream APIs expect."""
+    if params is None:
+        return None
+    cleaned = {}
+    for key, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ",".join(str(v) for v in value)
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        cleaned[key] = str(value)
+    return cleaned
+
+
+def _backoff_delay(attempt: int, retry_after: str | None = None) -> float:
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_MAX)
+        except ValueError:
+            pass
+    delay = min(BACKOFF_BASE * (2 ** attempt), BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+def _retry_after_seconds(retry_after: str | None) -> float | None:
+    try:
+        return float(retry_after) if retry_after else None
+    except ValueError:
+        return None
+
+
+async def _read_extracted(response: aiohttp.ClientResponse, extractor):
+    """ Feed a 2xx body to an extractor as it arrives, stopping once it has what it needs """
+    if response.content_length is not None and response.content_length <= STREAM_MIN_BYTES:
+        extractor.load(await response.read())
+        return extractor
+    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+        if extractor.feed(chunk):
+            remaining = (response.content_length or 0) - extractor.bytes_read
+            # Leaving the body unread closes the connection, a short rest is cheaper to read
+            if 0 < remaining <= DRAIN_LIMIT:
+                await response.content.read()
+            return extractor
+    extractor.close()
+    return extractor
+
+
+async def _send(session: aiohttp.ClientSession, method: str, url: str, limiter, extract=None, on_sent=None,
+                **kwargs):
+    """
+    Send one attempt, returning (status, Retry-After, body, headers_ms, body_ms).
+
+    With extract, a 2xx body is handed to a new extractor while it arrives and
+    the extractor is returned in place of the body. on_sent(1) is called once
+    the attempt is past the rate limiter, on_sent(-1) when it ends other than
+    by cancellation.
+    """
+    if limiter is not None:
+        await limiter.acquire()
+    if on_sent is not None:
+        on_sent(1)
+    started = time.monotonic()
+    status = None
+    retry_after = None
+    cancelled = False
+    try:
+        async with session.request(method, url, **kwargs) as response:
+            status = response.status
+            retry_after = response.headers.get("Retry-After")
+            headers_at = time.monotonic()
+            if extract is not None and status < 300:
+                try:
+                    body = await _read_extracted(response, extract())
+                except (ValueError, ijson.JSONError) as e:
+                    raise HttpError(status, url, f"Invalid JSON body: {e}") from None
+            else:
+                body = await response.read()
+            return (status, retry_after, body,
+                    round((headers_at - started) * 1000, 2), round((time.monotonic() - headers_at) * 1000, 2))
+    except asyncio.CancelledError:
+        cancelled = True
+        raise
+    finally:
+        if on_sent is not None and not cancelled:
+            on_sent(-1)
+        if limiter is not None:
+            limiter.release(status, time.monotonic() - started, _retry_after_seconds(retry_after), cancelled)
+
+
+async def request_json(method: str, url: str, *, headers=None, params=None, json=None, data=None,
+                       retries: int = MAX_RETRIES, timeout: aiohttp.ClientTimeout | None = None,
+                       provider: str = "-", phase: str = "-", hedge: bool | None = None, extract=None):
+    """
+    Send a request through the shared session and return the decoded JSON body.
+
+    For large answers, pass extract: a factory of JsonExtractor. The body is
+    then parsed as it arrives, only what the extractor keeps is held in
+    memory, and the extractor's result() is returned instead.
+
+    Connection errors, timeouts and retryable statuses are retried with
+    exponential backoff, all within the provider's deadline, counted from the
+    first attempt sent. Any other non-2xx answer, or a 2xx body that isn't
+    valid JSON, raises HttpError. While the provider's circuit is open the
+    call fails fast with CircuitOpenError.
+
+    Every attempt waits for the provider's rate limiter. Idempotent requests
+    (GETs by default) are hedged: a duplicate is sent once the first attempt
+    outlives the provider's observed p95. Every call is recorded as a provider
+    span named after `provider` and `phase`.
+    """
+    breaker = get_breaker(provider)
+    session = get_session()
+    params = _clean_params(params)
+    limiter = get_limiter(provider)
+    latency = get_latency(provider, phase)
+    if hedge is None:
+        hedge = method == "GET"
+
+    def can_hedge():
+        # A duplicate would only queue behind the first attempt
+        return limiter is None or not limiter.saturated
+
+    loop = asyncio.get_running_loop()
+    # Time queued in our own rate limiter says nothing about the provider: its
+    # deadline starts when the first attempt is sent
+    deadline = asyncio.timeout_at(loop.time() + QUEUE_WAIT_MAX)
+    sent_any = False
+    finished = False  # a hedge may get past the limiter just as the call ends
+    in_flight = 0  # attempts sent and neither answered nor failed yet
+
+    def on_sent(delta: int):
+        nonlocal sent_any, in_flight
+        if not sent_any and not finished:
+            sent_any = True
+            deadline.reschedule(loop.time() + deadline_for(provider))
+        in_flight += delta
+
+    def attempt():
+        return _send(session, method, url, limiter, extract, on_sent, headers=headers, params=params, json=json,
+                     data=data, timeout=timeout or TIMEOUT)
+
+    with span(f"{provider}.{phase}", "provider", provider=provider, phase=phase, method=method) as request_span:
+        try:
+            probing = breaker.check()
+        except CircuitOpenError:
+            request_span.set(circuit_open=True)
+            raise
+        try:
+            async with deadline:
+                attempt_number = 0
+                while True:
+                    try:
+                        if hedge:
+                            result, hedge_sent = await hedged(attempt, latency.p95(), allow=can_hedge)
+                            if hedge_sent:
+                                request_span.set(hedged=True)
+                        else:
+                            result = await attempt()
+                    except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                        breaker.record(False)
+                        if attempt_number >= retries:
+                            request_span.set(retries=attempt_number)
+                            raise
+                        delay = _backoff_delay(attempt_number)
+                        print(f"Retrying {method} {url} after {type(e).__name__} in {delay:.2f}s")
+                    else:
+                        status, retry_after, body, headers_ms, body_ms = result
+                        # 429s are the rate limiter's business, not a sign the provider is down
+                        if status != 429:
+                            breaker.record(status < 500)
+                        if status < 500:
+                            latency.add((headers_ms + body_ms) / 1000)
+                        if status in RETRY_STATUSES and attempt_number < retries:
+                            delay = _backoff_delay(attempt_number, retry_after)
+                            print(f"Retrying {method} {url} after {status} in {delay:.2f}s")
+                        else:
+                            streamed = not isinstance(body, bytes)
+                            request_span.set(status=status, bytes=body.bytes_read if streamed else len(body),
+                                             retries=attempt_number, headers_ms=headers_ms, body_ms=body_ms)
+                            if streamed:
+                                request_span.set(streamed=True, stopped_early=body.done)
+                                return body.result()
+                            if status >= 400:
+                                raise HttpError(status, url, body.decode(errors="replace"))
+                            if not body:
+                                return None
+                            try:
+                                return _json.loads(body)
+                            except ValueError as e:
+                                raise HttpError(status, url, f"Invalid JSON body: {e}") from None
+
+                    attempt_number += 1
+                    await asyncio.sleep(delay)
+        except TimeoutError:
+            if deadline.expired():
+                request_span.set(deadline_exceeded=True, queued=not in_flight)
+                if in_flight:
+                    breaker.record(False)
+            raise
+        finally:
+            finished = True
+            if probing:
+                breaker.end_probe()
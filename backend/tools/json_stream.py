@@ -0,0 +1,105 @@
+import json
+import ijson
+
+
+def _at(node, prefix: str):
+    """ Everything at an ijson-style prefix of a parsed document, "item" standing for array items """
+    nodes = [node]
+    for part in prefix.split("."):
+        if part == "item":
+            nodes = [item for node in nodes if isinstance(node, list) for item in node]
+        else:
+            nodes = [node[part] for node in nodes if isinstance(node, dict) and part in node]
+    return nodes
+
+
+class JsonExtractor:
+    """
+    Incremental JSON parser that keeps only the parts of a response a tool needs.
+
+    Feed it the body chunk by chunk as it arrives. Handlers registered for
+    `values` get the scalars at a prefix (e.g. "data.item.hotelId"); handlers
+    for `members` get (key, value) for every member of the object at a prefix,
+    each value built on its own and dropped once handled. A handler returning
+    True, or the end of the `stop_after` container, means nothing more is
+    needed: done turns True and the rest of the body can be left unread.
+
+    Small bodies are quicker to parse whole with load(), which runs the same handlers.
+    """
+
+    def __init__(self, values=None, members=None, stop_after: str | None = None):
+        self.values = values or {}  # prefix -> handler(value)
+        self.members = members or {}  # object prefix -> handler(key, value)
+        self.stop_after = stop_after
+        self.done = False
+        self.bytes_read = 0
+        self._events = ijson.sendable_list()
+        self._parser = ijson.parse_coro(self._events, use_float=True)
+        self._member = None  # (handler, key) of the value about to start
+        self._builder = None
+        self._depth = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """ Parse the next chunk of the body, returning whether enough was extracted """
+        if not chunk:
+            # yajl takes an empty chunk for the end of the body
+            return self.done
+        self.bytes_read += len(chunk)
+        self._parser.send(chunk)
+        self._handle_events()
+        return self.done
+
+    def close(self):
+        """ The whole body was fed; raises ijson.JSONError if it was not valid JSON, an empty body extracts nothing """
+        if not self.done and self.bytes_read:
+            self._parser.close()
+            self._handle_events()
+
+    def load(self, body: bytes):
+        """ Extract from a complete body in one go """
+        self.bytes_read = len(body)
+        document = json.loads(body) if body else None
+        for prefix, handler in self.members.items():
+            for container in _at(document, prefix):
+                for key, value in container.items() if isinstance(container, dict) else ():
+                    if handler(key, value):
+                        self.done = True
+                        return
+        for prefix, handler in self.values.items():
+            for value in _at(document, prefix):
+                if handler(value):
+                    self.done = True
+                    return
+
+    def _handle_events(self):
+        for prefix, event, value in self._events:
+            if self.done:
+                break
+            if self._builder is not None or self._member is not None:
+                self._build(event, value)
+            elif event == "map_key" and prefix in self.members:
+                self._member = (self.members[prefix], value)
+            elif prefix in self.values and event not in ("start_map", "start_array", "end_map", "end_array"):
+                self.done = bool(self.values[prefix](value))
+            elif event in ("end_map", "end_array") and prefix == self.stop_after:
+                self.done = True
+        del self._events[:]
+
+    def _build(self, event: str, value):
+        if self._builder is None:
+            self._builder = ijson.ObjectBuilder()
+        self._builder.event(event, value)
+        if event in ("start_map", "start_array"):
+            self._depth += 1
+        elif event in ("end_map", "end_array"):
+            self._depth -= 1
+        if self._depth:
+            return
+        handler, key = self._member
+        built = self._builder.value
+        self._member = None
+        self._builder = None
+        self.done = bool(handler(key, built))
+
+    def result(self):
+        raise NotImplementedError
@@ -0,0 +1,245 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from tools.results import render_result
+
+# Bundled airport/city dataset, see the header of the file for its format.
+# resources/build_locations.py completes it with every airport in OurAirports
+LOCATIONS_PATH = os.getenv("LOCATIONS_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "resources", "locations.tsv"
+)
+# Fuzzy matches scoring below this are not considered the same place
+MIN_SCORE = 0.45
+# Words people add to place names that don't help telling places apart
+NOISE_WORDS = {
+    "airport", "aeropuerto", "aeroport", "aeroporto", "flughafen", "luchthaven", "lotnisko",
+    "international", "internacional", "intl", "city", "ciudad", "ville", "citta",
+}
+IATA_CODE = re.compile(r"^[A-Z]{3}$")
+
+
+@dataclass(frozen=True)
+class Location:
+    """An airport, or a city (metro area) served by one or more airports."""
+    kind: str  # "city" or "airport"
+    code: str
+    city_code: str
+    country: str
+    name: str
+
+
+def fold(text: str) -> str:
+    """ Casefold, strip accents and punctuation, so 'Múnich' and 'munich' compare equal """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+
+def normalize(text: str) -> str:
+    """ Folded place name without words like 'airport' that don't tell places apart """
+    words = fold(text).split()
+    return " ".join(word for word in words if word not in NOISE_WORDS) or " ".join(words)
+
+
+def _trigrams(name: str) -> set[str]:
+    # Padding makes the leading trigrams work as a prefix index
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class LocationIndex:
+    """
+    In-memory airport/city lookup by code and by (fuzzy, multilingual) name.
+
+    Every name and alias is normalized and indexed by its padded trigrams.
+    A query scores candidates by shared trigrams, with a bonus for prefix
+    matches, so typos, missing accents and partial names still resolve.
+    """
+
+    def __init__(self, rows):
+        self.airports = {}  # code -> Location
+        self.cities = {}  # code -> Location
+        self.city_airports = {}  # city code -> [Location], main airport first
+        self._names = []  # [(normalized name, Location)]
+        self._exact = {}  # normalized name -> [name index]
+        self._grams = {}  # trigram -> [name index]
+        self._gram_counts = []  # name index -> number of trigrams
+
+        for kind, code, city_code, country, name, *aliases in rows:
+            location = Location(kind, code, city_code, country, name)
+            if kind == "city":
+                self.cities[code] = location
+            else:
+                self.airports[code] = location
+                self.city_airports.setdefault(city_code, []).append(location)
+            names = {normalize(name)}
+            for alias in aliases[0].split("|") if aliases and aliases[0] else ():
+                names.add(normalize(alias))
+            for normalized in names:
+                self._add_name(normalized, location)
+
+        # Lists are only needed while building
+        self._grams = {gram: tuple(ids) for gram, ids in self._grams.items()}
+
+    def _add_name(self, normalized: str, location: Location):
+        name_id = len(self._names)
+        self._names.append((normalized, location))
+        self._exact.setdefault(normalized, []).append(name_id)
+        grams = _trigrams(normalized)
+        self._gram_counts.append(len(grams))
+        for gram in grams:
+            self._grams.setdefault(gram, []).append(name_id)
+
+    @classmethod
+    def from_file(cls, path: str = LOCATIONS_PATH) -> "LocationIndex":
+        with open(path, encoding="utf-8") as f:
+            rows = [line.rstrip("\n").split("\t") for line in f if line.strip() and not line.startswith("#")]
+        return cls(rows)
+
+    def search(self, query: str, limit: int = 5) -> list[tuple[float, Location]]:
+        """ Best matching places for a name, best first, cities before their airports on ties """
+        normalized = normalize(query)
+        if not normalized:
+            return []
+
+        scores = {}
+        for name_id in self._exact.get(normalized, ()):
+            scores[self._names[name_id][1]] = 1.0
+
+        grams = _trigrams(normalized)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        for name_id, count in shared.items():
+            name, location = self._names[name_id]
+            score = 2 * count / (len(grams) + self._gram_counts[name_id])
+            if len(normalized) >= 3 and name.startswith(normalized):
+                score = max(score, 0.6 + 0.3 * len(normalized) / len(name))
+            if score > scores.get(location, 0.0):
+                scores[location] = score
+
+        ranked = sorted(
+            ((score, location) for location, score in scores.items() if score >= MIN_SCORE),
+            key=lambda match: (-match[0], match[1].kind != "city", match[1].code),
+        )
+        return ranked[:limit]
+
+    def main_airport(self, city_code: str) -> Location | None:
+        airports = self.city_airports.get(city_code)
+        return airports[0] if airports else None
+
+
+_index: LocationIndex | None = None
+
+
+def get_index() -> LocationIndex:
+    """ The bundled location index, loaded on first use """
+    global _index
+    if _index is None:
+        _index = LocationIndex.from_file()
+    return _index
+
+
+def _as_code(value: str) -> str | None:
+    code = value.strip().upper()
+    return code if IATA_CODE.match(code) else None
+
+
+def airport_code(value: str) -> tuple[str | None, str | None]:
+    """
+    Airport IATA code for a code or place name, as (code, None) or (None, error message).
+
+    City codes and names resolve to the city's main airport. A well-formed code
+    is never matched as a name ("NUE" is not "Nueva York"); one missing from the
+    bundled dataset is passed through for the provider to judge.
+    """
+    index = get_index()
+    code = _as_code(value)
+    if code in index.airports:
+        return code, None
+    if code in index.cities and index.main_airport(code):
+        return index.main_airport(code).code, None
+    if code is not None:
+        return code, None
+
+    matches = index.search(value, limit=1)
+    if matches:
+        location = matches[0][1]
+        airport = location if location.kind == "airport" else index.main_airport(location.code)
+        if airport is not None:
+            return airport.code, None
+    return None, f"Unknown airport '{value}'. Call resolve_location to find its IATA code."
+
+
+def city_code(value: str) -> tuple[str | None, str | None]:
+    """
+    City IATA code for a city or airport code or a place name, as (code, None) or (None, error message).
+    """
+    index = get_index()
+    code = _as_code(value)
+    if code in index.cities:
+        return code, None
+    if code in index.airports:
+        return index.airports[code].city_code, None
+    if code is not None:
+        return code, None
+
+    matches = index.search(value, limit=1)
+    if matches:
+        return matches[0][1].city_code, None
+    return None, f"Unknown city '{value}'. Call resolve_location to find its city code."
+
+
+def city_name(value: str) -> str:
+    """ English name of the city behind a code or a spelling in any language, else value as given """
+    index = get_index()
+    code = _as_code(value)
+    if code in index.airports:
+        code = index.airports[code].city_code
+    if code in index.cities:
+        return index.cities[code].name
+
+    matches = index.search(value, limit=1)
+    if matches and matches[0][0] >= 0.8:
+        return index.cities[matches[0][1].city_code].name
+    return value.strip()
+
+
+def local_airport_city(airport_iata: str) -> tuple[str, str] | None:
+    """ (city code, city name) an airport serves, if the bundled dataset knows it """
+    index = get_index()
+    airport = index.airports.get(airport_iata.strip().upper())
+    if airport is None or airport.city_code not in index.cities:
+        return None
+    return airport.city_code, index.cities[airport.city_code].name
+
+
+def resolve_location(query: str) -> str:
+    """
+    Airports and city codes matching a spoken place name, for the resolve_location tool.
+    """
+    index = get_index()
+    code = _as_code(query)
+    matches = []
+    if code in index.cities:
+        matches.append(index.cities[code])
+    if code in index.airports:
+        matches.append(index.airports[code])
+    matches += [location for _, location in index.search(query) if location not in matches]
+    if not matches:
+        return f"No airport or city found for '{query}'. If you know its IATA code, use it directly."
+
+    rows = []
+    for location in matches[:5]:
+        city = index.cities.get(location.city_code)
+        if location.kind == "city":
+            airports = ", ".join(airport.code for airport in index.city_airports.get(location.code, []))
+            rows.append(("city", location.name, location.country, location.code, airports))
+        else:
+            rows.append(("airport", location.name, location.country, location.city_code,
+                         f"{location.code} ({city.name if city else location.city_code})"))
+    return render_result("locations", f"Locations matching '{query.strip()}'",
+                         ("Kind", "Name", "Country", "City code", "Airports"), rows,
+                         notes=["Use airport codes for flights and the city code for hotels."])
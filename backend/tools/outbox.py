@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from models import SendEmail
+from tools.http_client import HttpError, REQUEST_ERRORS
+from tools.ratelimit import create_task_with_priority, BACKGROUND
+
+# Pending messages are persisted here so a worker restart doesn't lose them
+OUTBOX_DIR = os.getenv("OUTBOX_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "outbox"
+)
+MAX_ATTEMPTS = 6
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 300.0
+# Seconds a finishing job waits for its emails, below livekit's 10s shutdown_process_timeout
+DRAIN_TIMEOUT = 8.0
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Outbox:
+    """
+    Queue of emails delivered in the background with retries and backoff.
+
+    Each pending message is a JSON file in OUTBOX_DIR, claimed by the worker
+    process that delivers it. Files left by a dead process are picked up
+    again by the next outbox that starts.
+    """
+
+    def __init__(self, deliver, directory: str = OUTBOX_DIR):
+        self.deliver = deliver  # async deliver(SendEmail), raises on failure
+        self.directory = directory
+        self._messages = {}  # id -> message dict
+        self._queue = None
+        self._worker = None
+
+    def _path(self, message_id: str) -> str:
+        return os.path.join(self.directory, f"{message_id}.json.{os.getpid()}")
+
+    def _save(self, message: dict):
+        path = self._path(message["id"])
+        with open(path + ".tmp", "w") as f:
+            json.dump(message, f)
+        os.replace(path + ".tmp", path)
+
+    def _forget(self, message: dict):
+        try:
+            os.remove(self._path(message["id"]))
+        except FileNotFoundError:
+            pass
+
+    def _recover(self):
+        """ Claim messages that were never delivered by a previous (or dead) process """
+        for name in os.listdir(self.directory):
+            parts = name.split(".")
+            if len(parts) != 3 or parts[1] != "json":
+                continue
+            message_id, _, pid = parts
+            if not pid.isdigit() or message_id in self._messages:
+                continue
+            if int(pid) != os.getpid() and _pid_alive(int(pid)):
+                continue
+            try:
+                os.replace(os.path.join(self.directory, name), self._path(message_id))
+            except FileNotFoundError:
+                continue  # Another process claimed it first
+            with open(self._path(message_id)) as f:
+                message = json.load(f)
+            if message["status"] == "pending":
+                print(f"Recovered pending email {message_id}")
+                self._messages[message_id] = message
+                self._queue.put_nowait(message_id)
+
+    def start(self):
+        """ Start the delivery worker on the running loop, if it isn't running yet """
+        if self._worker is not None and not self._worker.done():
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._queue = asyncio.Queue()
+        for message_id, message in self._messages.items():
+            if message["status"] == "pending":
+                self._queue.put_nowait(message_id)
+        self._recover()
+        self._worker = create_task_with_priority(self._run(), BACKGROUND)
+
+    def enqueue(self, params: SendEmail) -> str:
+        """ Persist an email and return its id immediately; delivery happens later """
+        self.start()
+        message = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "created_at": time.time(),
+            "email": params.model_dump(),
+        }
+        self._save(message)
+        self._messages[message["id"]] = message
+        self._queue.put_nowait(message["id"])
+        return message["id"]
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT):
+        """
+        Deliver what is still pending before the job process exits, retrying
+        without the usual backoff. Whatever is left at the timeout stays on disk
+        for the next outbox on this host to recover.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+        deadline = time.monotonic() + timeout
+
+        async def deliver_pending():
+            while True:
+                pending = [message for message in self._messages.values() if message["status"] == "pending"]
+                if not pending:
+                    return
+                for message in pending:
+                    await self._attempt(message)
+                await asyncio.sleep(min(BACKOFF_BASE, max(deadline - time.monotonic(), 0)))
+
+        try:
+            await asyncio.wait_for(deliver_pending(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Outbox drain timed out after {timeout}s, undelivered emails stay queued")
+
+    def status(self, message_id: str) -> dict | None:
+        return self._messages.get(message_id.strip())
+
+    async def _run(self):
+        while True:
+            message_id = await self._queue.get()
+            message = self._messages.get(message_id)
+            if message is None or message["status"] != "pending":
+                continue
+            await self._attempt(message)
+
+    async def _attempt(self, message: dict):
+        message["attempts"] += 1
+        try:
+            await self.deliver(SendEmail(**message["email"]))
+        except REQUEST_ERRORS as e:
+            message["error"] = str(e)
+            permanent = isinstance(e, HttpError) and 400 <= e.status < 500 and e.status != 429
+            if permanent or message["attempts"] >= MAX_ATTEMPTS:
+                message["status"] = "failed"
+                print(f"Email {message['id']} failed after {message['attempts']} attempts: {e!r}")
+                self._forget(message)
+                return
+            delay = min(BACKOFF_BASE * (2 ** (message["attempts"] - 1)), BACKOFF_MAX)
+            delay *= 0.5 + random.random() / 2
+            print(f"Email {message['id']} attempt {message['attempts']} failed, retrying in {delay:.1f}s")
+            self._save(message)
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, message["id"])
+            return
+
+        message["status"] = "sent"
+        message["error"] = None
+        self._forget(message)
@@ -0,0 +1,85 @@
+import asyncio
+import os
+from models import SearchHotelRequest, SearchEventRequest
+from tools.cache import request_key
+from tools.ratelimit import create_task_with_priority, PREFETCH
+from tools.hotels import search_hotels
+from tools.events import search_events
+from tools.reference import airport_city, city_hotel_ids
+from tools.dates import travel_date
+
+# Speculative searches one session may start in total
+PREFETCH_MAX_SEARCHES = int(os.getenv("PREFETCH_MAX_SEARCHES") or "6")
+
+
+class PrefetchScheduler:
+    """
+    Starts hotel and event searches in the background as soon as a flight
+    search reveals the destination and dates.
+
+    The searches go through the same cached, coalescing search functions as
+    the tools, so a later search_hotels or search_events call with the same
+    parameters resolves from the finished (or still running) prefetch. Their
+    upstream requests run at prefetch priority, behind the tool calls.
+    """
+
+    def __init__(self, max_searches: int = PREFETCH_MAX_SEARCHES):
+        self.max_searches = max_searches
+        self.started = 0
+        self.adults = None  # party size, unknown until the user searches hotels
+        self._destination = None
+        self._tasks = {}  # key -> asyncio.Task
+
+    def prefetch_destination(self, airport_iata: str, year: int, month: int, day: int):
+        """
+        Speculatively search hotels and events near a flight destination.
+        """
+        if travel_date(year, month, day)[1]:
+            return
+        destination = airport_iata.strip().upper()
+        if destination != self._destination:
+            # The user moved on to another destination, drop the old guesses
+            self.cancel()
+            self._destination = destination
+        self._start(("destination", destination, year, month, day, self.adults),
+                     self._prefetch_destination(destination, year, month, day, self.adults),
+                     counted=False)
+
+    async def _prefetch_destination(self, airport_iata: str, year: int, month: int, day: int, adults: int):
+        city = await airport_city(airport_iata)
+        if city is None:
+            return
+        city_code, city_name = city
+
+        if adults is None:
+            # Offers are cached per party size, without it only the city's hotel list can be fetched ahead
+            self._start(("hotel_ids", city_code), city_hotel_ids(city_code))
+        else:
+            hotel_params = SearchHotelRequest(locationIata=city_code, adults=adults, year=year, month=month, day=day)
+            self._start(request_key("hotels", hotel_params), search_hotels(hotel_params))
+
+        event_params = SearchEventRequest(location=city_name, year=year, month=month, day=day)
+        self._start(request_key("events", event_params), search_events(event_params))
+
+    def _start(self, key, coro, counted: bool = True) -> bool:
+        if key in self._tasks or (counted and self.started >= self.max_searches):
+            coro.close()
+            return False
+        if counted:
+            self.started += 1
+        self._tasks[key] = create_task_with_priority(self._run(key, coro), PREFETCH)
+        return True
+
+    async def _run(self, key, coro):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Prefetch {key[0]} failed: {e!r}")
+
+    def cancel(self):
+        """ Cancel every pending prefetch; shared searches others await keep running """
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
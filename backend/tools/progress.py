@@ -0,0 +1,52 @@
+import asyncio
+import contextvars
+import os
+from tools.results import rendered
+
+# Seconds a tool may keep the user waiting before the agent speaks what it has so far
+INTERIM_DELAY = float(os.getenv("INTERIM_DELAY") or "1.5")
+
+_listener = contextvars.ContextVar("partial_listener", default=None)
+
+
+def report_partial(render):
+    """
+    Offer a partial answer of the running search.
+
+    render() builds the answer and is only called if it is going to be spoken,
+    so searches can report after every provider or chunk for free.
+    """
+    listener = _listener.get()
+    if listener is not None:
+        listener(render)
+
+
+async def progressive(context, search, interim: str, record=lambda answer: answer, delay: float = INTERIM_DELAY):
+    """
+    Await a search coroutine on behalf of a function tool, speaking early if it is slow.
+
+    When the search is still running after delay seconds, its latest partial
+    answer (or the interim acknowledgement, if nothing arrived yet) is pushed to
+    the session with context.update(). The agent speaks that right away, and the
+    complete answer returned at the end is folded into its next reply.
+    Without a RunContext, e.g. in the benchmarks, this just awaits the search.
+    """
+    if context is None:
+        return await search
+
+    partials = []
+    token = _listener.set(partials.append)
+    try:
+        # The task inherits the listener, the caller's context stays clean
+        task = asyncio.ensure_future(search)
+    finally:
+        _listener.reset(token)
+
+    try:
+        done, _ = await asyncio.wait({task}, timeout=delay)
+        if not done:
+            await context.update(record(rendered(partials[-1]())) if partials else interim)
+        return await task
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,218 @@
+import calendar
+import re
+import sys
+import numpy as np
+from tools.json_stream import JsonExtractor
+
+# Score = price + indirect * (not direct) + day_distance * |date - requested day|
+FLIGHT_SCORE_WEIGHTS = {
+    "indirect": 30.0,
+    "day_distance": 10.0,
+}
+FLIGHT_DAY_WINDOW = 3
+FLIGHT_TOP_K = 8
+# Quotes kept per answer: the top K are shown, the rest are paged with more_results
+FLIGHT_MAX_RESULTS = 40
+
+AIRLINE_PATTERN = re.compile(r'\*([a-z]+)\*([A-Z]{2,})')
+QUOTES_PREFIX = "content.results"
+
+
+class Quote:
+    """ The fields of one Skyscanner indicative quote the flight tools use """
+
+    __slots__ = ("id", "price", "direct", "year", "month", "day", "carrier_id", "destination_id")
+
+    def __init__(self, identifier: str, quote: dict):
+        leg = quote.get("outboundLeg", {})
+        departure = leg.get("departureDateTime", {})
+        self.id = identifier
+        try:
+            self.price = float(quote.get("minPrice", {}).get("amount"))
+        except (TypeError, ValueError):
+            self.price = float("nan")
+        self.direct = bool(quote.get("isDirect", False))
+        self.year = departure.get("year", 0)
+        self.month = departure.get("month", 0)
+        self.day = departure.get("day", 0)
+        self.carrier_id = leg.get("marketingCarrierId")
+        self.destination_id = leg.get("destinationPlaceId", "")
+
+
+class IndicativeQuotes:
+    """
+    Quotes of one indicative search plus the carriers and place codes they refer to.
+
+    Far smaller than the response it was extracted from, so it is what the
+    flights cache keeps.
+    """
+
+    __slots__ = ("quotes", "carriers", "places")
+
+    def __init__(self):
+        self.quotes = []  # [Quote]
+        self.carriers = {}  # carrier id -> {"name", "iata"}
+        self.places = {}  # place id -> IATA code
+
+    def __len__(self):
+        return len(self.quotes)
+
+    def __sizeof__(self):
+        # Rough estimate for the cache's byte budget: a record plus its id string per quote
+        per_quote = sys.getsizeof(self.quotes[0]) + sys.getsizeof(self.quotes[0].id) if self.quotes else 0
+        return 64 + len(self.quotes) * per_quote + 128 * (len(self.carriers) + len(self.places))
+
+
+class IndicativeQuotesExtractor(JsonExtractor):
+    """
+    Streams an indicative search response into IndicativeQuotes, one quote at a
+    time, and stops reading at the end of its results.
+    """
+
+    def __init__(self):
+        self.extracted = IndicativeQuotes()
+        super().__init__(members={
+            f"{QUOTES_PREFIX}.quotes": self._quote,
+            f"{QUOTES_PREFIX}.carriers": self._carrier,
+            f"{QUOTES_PREFIX}.places": self._place,
+        }, stop_after=QUOTES_PREFIX)
+
+    def _quote(self, identifier, quote):
+        if isinstance(quote, dict):
+            self.extracted.quotes.append(Quote(identifier, quote))
+
+    def _carrier(self, carrier_id, carrier):
+        if isinstance(carrier, dict):
+            self.extracted.carriers[carrier_id] = {"name": carrier.get("name"), "iata": carrier.get("iata")}
+
+    def _place(self, place_id, place):
+        if isinstance(place, dict) and place.get("iata"):
+            self.extracted.places[place_id] = place["iata"]
+
+    def result(self) -> IndicativeQuotes:
+        return self.extracted
+
+
+class QuoteTable:
+    """
+    Column-oriented view of Skyscanner indicative quotes.
+
+    Prices, dates and direct flags live in NumPy arrays so filtering, scoring
+    and top-K selection run in one vectorized pass over the whole month.
+    """
+
+    __slots__ = ("ids", "price", "direct", "date", "carrier_ids", "destination_ids", "carriers")
+
+    def __init__(self, ids, price, direct, date, carrier_ids, destination_ids, carriers):
+        self.ids = ids                          # np.ndarray[object] of quote identifiers
+        self.price = price                      # np.ndarray[float64], NaN when missing
+        self.direct = direct                    # np.ndarray[bool]
+        self.date = date                        # np.ndarray[datetime64[D]], NaT when missing
+        self.carrier_ids = carrier_ids          # np.ndarray[object] of marketing carrier ids
+        self.destination_ids = destination_ids  # np.ndarray[object] of destination place ids
+        self.carriers = carriers                # carrier id -> {"name", "iata"}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_quotes(cls, extracted: IndicativeQuotes | None) -> "QuoteTable":
+        quotes = extracted.quotes if extracted is not None else []
+        count = len(quotes)
+
+        ids = np.empty(count, dtype=object)
+        carrier_ids = np.empty(count, dtype=object)
+        destination_ids = np.empty(count, dtype=object)
+        price = np.fromiter((quote.price for quote in quotes), dtype=np.float64, count=count)
+        direct = np.fromiter((quote.direct for quote in quotes), dtype=bool, count=count)
+        ymd = np.zeros((count, 3), dtype=np.int64)
+
+        for i, quote in enumerate(quotes):
+            ids[i] = quote.id
+            carrier_ids[i] = quote.carrier_id
+            destination_ids[i] = quote.destination_id
+            ymd[i] = (quote.year, quote.month, quote.day)
+
+        return cls(ids, price, direct, _to_dates(ymd), carrier_ids, destination_ids, extracted.carriers if extracted is not None else {})
+
+    def take(self, index) -> "QuoteTable":
+        return QuoteTable(self.ids[index], self.price[index], self.direct[index], self.date[index],
+                          self.carrier_ids[index], self.destination_ids[index], self.carriers)
+
+    def rank(self, target=None, window: int = FLIGHT_DAY_WINDOW, top_k: int = FLIGHT_TOP_K,
+             weights: dict = FLIGHT_SCORE_WEIGHTS) -> "QuoteTable":
+        """
+        Keep quotes within `window` days of `target` (a date, or None for the
+        whole month), score them and return the best `top_k`, best first.
+        """
+        valid = ~np.isnan(self.price)
+        distance = np.zeros(len(self), dtype=np.float64)
+        if target is not None:
+            delta = (self.date - np.datetime64(target, "D")).astype(np.float64)
+            distance = np.abs(delta)
+            valid &= ~np.isnat(self.date) & (distance <= window)
+
+        score = (self.price
+                 + weights.get("indirect", 0.0) * ~self.direct
+                 + weights.get("day_distance", 0.0) * np.nan_to_num(distance))
+        candidates = np.flatnonzero(valid)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(score[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.lexsort((self.date[candidates], score[candidates]))]
+        return self.take(order)
+
+    def airline(self, i: int) -> str:
+        """ Human-readable carrier label for row i """
+        carrier = self.carriers.get(self.carrier_ids[i] or "", {})
+        if carrier.get("name"):
+            return f"{carrier['name']}-{carrier.get('iata', '')}".rstrip("-")
+        airline_match = AIRLINE_PATTERN.search(self.ids[i])
+        if airline_match:
+            return f"{airline_match.group(1)}-{airline_match.group(2)}"
+        return self.ids[i]
+
+
+def _to_dates(ymd: np.ndarray) -> np.ndarray:
+    """ Vectorized (year, month, day) -> datetime64[D], NaT where incomplete """
+    missing = (ymd <= 0).any(axis=1)
+    safe = np.where(missing[:, None], 1, ymd)
+    months = (safe[:, 0] - 1970) * 12 + (safe[:, 1] - 1)
+    dates = months.astype("datetime64[M]").astype("datetime64[D]") + (safe[:, 2] - 1).astype("timedelta64[D]")
+    dates[missing] = np.datetime64("NaT")
+    return dates
+
+
+class PriceCalendar:
+    """
+    Cheapest and cheapest direct fare for every day of one route and month.
+    """
+
+    __slots__ = ("year", "month", "cheapest", "cheapest_direct")
+
+    def __init__(self, year: int, month: int, cheapest, cheapest_direct):
+        self.year = year
+        self.month = month
+        self.cheapest = cheapest                # np.ndarray[float64] per day, inf when no quote
+        self.cheapest_direct = cheapest_direct  # np.ndarray[float64] per day, inf when no direct quote
+
+    @classmethod
+    def from_table(cls, table: QuoteTable, year: int, month: int) -> "PriceCalendar":
+        days = calendar.monthrange(year, month)[1]
+        first = np.datetime64(f"{year:04d}-{month:02d}-01", "D")
+        index = (table.date - first).astype(np.int64)
+        valid = ~np.isnat(table.date) & ~np.isnan(table.price) & (index >= 0) & (index < days)
+
+        cheapest = np.full(days, np.inf)
+        np.minimum.at(cheapest, index[valid], table.price[valid])
+        direct = valid & table.direct
+        cheapest_direct = np.full(days, np.inf)
+        np.minimum.at(cheapest_direct, index[direct], table.price[direct])
+        return cls(year, month, cheapest, cheapest_direct)
+
+    def __sizeof__(self):
+        # The two per-day arrays are the whole of it, the cache's byte budget counts them
+        return 64 + self.cheapest.nbytes + self.cheapest_direct.nbytes
+
+    def fares(self, day: int) -> tuple[float, float]:
+        """ (cheapest, cheapest direct) fare on a day of this month """
+        return self.cheapest[day - 1], self.cheapest_direct[day - 1]
@@ -0,0 +1,265 @@
+import asyncio
+import contextvars
+import itertools
+import os
+import sqlite3
+import threading
+import time
+
+# Priority classes, lower wins: interactive tool calls go before prefetch and background work
+INTERACTIVE = 0
+PREFETCH = 1
+BACKGROUND = 2
+
+# Share of the concurrency limit each priority class may use, keeping headroom for tool calls
+PRIORITY_SHARE = {
+    INTERACTIVE: 1.0,
+    PREFETCH: 0.75,
+    BACKGROUND: 0.5,
+}
+
+# provider -> (requests per second, burst, max concurrency, target latency in seconds)
+PROVIDER_LIMITS = {
+    "skyscanner": (5.0, 10, 8, 2.0),
+    "amadeus": (10.0, 10, 8, 2.0),
+    "ticketmaster": (5.0, 5, 4, 2.0),
+    "sendgrid": (10.0, 10, 4, 2.0),
+}
+
+# Worker processes on this host draw from one quota stored here; RATELIMIT_SHARED=0 keeps it per process
+RATELIMIT_DB_PATH = os.getenv("RATELIMIT_DB_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "ratelimit.sqlite3"
+)
+RATELIMIT_SHARED = os.getenv("RATELIMIT_SHARED") != "0"
+
+
+class PriorityBox:
+    """ Mutable priority shared by a task and the tasks it spawns, so it can be boosted later """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
+        self.value = value
+
+
+_priority = contextvars.ContextVar("request_priority", default=None)
+
+
+def current_priority_box() -> PriorityBox | None:
+    return _priority.get()
+
+
+def current_priority() -> int:
+    box = _priority.get()
+    return INTERACTIVE if box is None else box.value
+
+
+def boost(box: PriorityBox | None, priority: int):
+    """ Raise the priority of work someone more urgent now waits for """
+    if box is not None and priority < box.value:
+        box.value = priority
+
+
+def create_task_with_priority(coro, priority: int) -> asyncio.Task:
+    """ Run coro as a task whose upstream requests use the given priority class """
+    context = contextvars.copy_context()
+    context.run(_priority.set, PriorityBox(priority))
+    return asyncio.create_task(coro, context=context)
+
+
+class LocalTokenBucket:
+    """ Token bucket for a single process """
+
+    def __init__(self, provider: str, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.time()
+        self._blocked_until = 0.0
+
+    def take(self) -> float:
+        """ Take a token, returning 0, or the seconds to wait before trying again """
+        now = time.time()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def block(self, seconds: float):
+        """ Hand out no tokens for a while, e.g. after a 429 """
+        self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+
+class SharedTokenBucket:
+    """
+    Token bucket kept in SQLite, so every worker process on the host shares one quota.
+    """
+
+    _local = threading.local()
+
+    def __init__(self, provider: str, rate: float, burst: int, path: str = RATELIMIT_DB_PATH):
+        self.provider = provider
+        self.rate = rate
+        self.burst = burst
+        self.path = path
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per executor thread
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if self.path not in connections:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "provider TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, blocked_until REAL NOT NULL)"
+            )
+            connections[self.path] = connection
+        return connections[self.path]
+
+    def _update(self, change) -> float:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute(
+                "SELECT tokens, updated_at, blocked_until FROM buckets WHERE provider = ?", (self.provider,)
+            ).fetchone()
+            tokens, updated_at, blocked_until = row if row is not None else (self.burst, now, 0.0)
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+            tokens, blocked_until, result = change(now, tokens, blocked_until)
+            connection.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)", (self.provider, tokens, now, blocked_until)
+            )
+            connection.execute("COMMIT")
+            return result
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def take(self) -> float:
+        def change(now, tokens, blocked_until):
+            if now < blocked_until:
+                return tokens, blocked_until, blocked_until - now
+            if tokens >= 1:
+                return tokens - 1, blocked_until, 0.0
+            return tokens, blocked_until, (1 - tokens) / self.rate
+        return self._update(change)
+
+    def block(self, seconds: float):
+        self._update(lambda now, tokens, blocked_until: (tokens, max(blocked_until, now + seconds), None))
+
+
+class ProviderLimiter:
+    """
+    Rate and concurrency limit for one upstream provider.
+
+    Requests wait for a concurrency slot in priority order, then for a token
+    from the provider's bucket. The concurrency limit adapts: it halves on
+    429s, shrinks when latency exceeds the target and grows back slowly on
+    healthy answers.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int, max_concurrency: int, target_latency: float):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        if RATELIMIT_SHARED:
+            self.bucket = SharedTokenBucket(provider, rate, burst)
+        else:
+            self.bucket = LocalTokenBucket(provider, rate, burst)
+        self._waiters = []  # [seq, priority box or static priority]
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+
+    @staticmethod
+    def _priority(waiter) -> int:
+        box = waiter[1]
+        return box.value if isinstance(box, PriorityBox) else box
+
+    def _ready(self, waiter) -> bool:
+        best = min(self._waiters, key=lambda w: (self._priority(w), w[0]))
+        if best is not waiter:
+            return False
+        cap = max(1.0, self.limit * PRIORITY_SHARE[self._priority(waiter)])
+        return self.in_flight < cap
+
+    @property
+    def saturated(self) -> bool:
+        """ Whether a new request would have to wait for a slot """
+        return bool(self._waiters) or self.in_flight >= self.limit
+
+    async def acquire(self):
+        waiter = [next(self._seq), current_priority_box() or INTERACTIVE]
+        self._waiters.append(waiter)
+        try:
+            while not self._ready(waiter):
+                self._changed.clear()
+                try:
+                    # Re-check periodically too: a waiting prefetch may get boosted
+                    await asyncio.wait_for(self._changed.wait(), 0.25)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self._waiters.remove(waiter)
+        self.in_flight += 1
+        self._changed.set()
+
+        try:
+            while True:
+                if isinstance(self.bucket, SharedTokenBucket):
+                    wait = await asyncio.to_thread(self.bucket.take)
+                else:
+                    wait = self.bucket.take()
+                if wait <= 0:
+                    return
+                await asyncio.sleep(wait)
+        except BaseException:
+            self.in_flight -= 1
+            self._changed.set()
+            raise
+
+    def release(self, status: int | None, latency: float, retry_after: float | None = None, cancelled: bool = False):
+        """
+        End an attempt. status is None when it failed to connect; a cancelled
+        attempt (a hedge loser, a caller's deadline) says nothing about the provider.
+        """
+        self.in_flight -= 1
+        if cancelled:
+            self._changed.set()
+            return
+        if status == 429:
+            self.limit = max(1.0, self.limit / 2)
+            pause = retry_after or 1.0
+            print(f"{self.provider} rate limited, concurrency limit now {self.limit:.1f}, pausing {pause:.1f}s")
+            if isinstance(self.bucket, SharedTokenBucket):
+                asyncio.get_running_loop().run_in_executor(None, self.bucket.block, pause)
+            else:
+                self.bucket.block(pause)
+        elif status is None or status >= 500 or latency > self.target_latency:
+            self.limit = max(1.0, self.limit * 0.9)
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self._changed.set()
+
+
+_limiters = {}
+
+
+def get_limiter(provider: str) -> ProviderLimiter | None:
+    """ The limiter of a provider in this event loop, or None for unlimited providers """
+    if provider not in PROVIDER_LIMITS:
+        return None
+    loop = asyncio.get_running_loop()
+    limiter = _limiters.get((loop, provider))
+    if limiter is None:
+        limiter = _limiters[(loop, provider)] = ProviderLimiter(provider, *PROVIDER_LIMITS[provider])
+    return limiter
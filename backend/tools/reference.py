@@ -0,0 +1,213 @@
+import os
+import sqlite3
+import time
+from tools.http_client import request_json, HttpError, REQUEST_ERRORS
+from tools.amadeus_auth import AMADEUS_BASE_URL, amadeus_headers, get_token_manager
+from tools.tracing import annotate
+from tools.ratelimit import create_task_with_priority, BACKGROUND
+from tools.locations import local_airport_city
+from tools.json_stream import JsonExtractor
+
+# On-disk store for Amadeus reference data that barely changes
+REFERENCE_DB_PATH = os.getenv("REFERENCE_DB_PATH") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "reference.sqlite3"
+)
+# Entries older than this are still served, but refreshed in the background
+REFRESH_AFTER_SECONDS = 7 * 24 * 3600
+# Big cities list thousands of hotels; hotel searches stop long before reaching this many
+MAX_CITY_HOTELS = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS city_hotels (
+    city_code TEXT PRIMARY KEY,
+    hotel_ids TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS airport_cities (
+    airport_iata TEXT PRIMARY KEY,
+    city_code TEXT NOT NULL,
+    city_name TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS city_geocodes (
+    city TEXT PRIMARY KEY,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+_db: sqlite3.Connection | None = None
+_refreshing = {}  # (table, key) -> asyncio.Task
+
+
+def _connection() -> sqlite3.Connection:
+    """ Open the reference store on first use """
+    global _db
+    if _db is None:
+        os.makedirs(os.path.dirname(REFERENCE_DB_PATH), exist_ok=True)
+        _db = sqlite3.connect(REFERENCE_DB_PATH, check_same_thread=False, isolation_level=None)
+        _db.execute("PRAGMA journal_mode=WAL")
+        _db.executescript(_SCHEMA)
+    return _db
+
+
+def _is_stale(updated_at: float) -> bool:
+    return time.time() - updated_at > REFRESH_AFTER_SECONDS
+
+
+def _refresh_in_background(table: str, key: str, refresh):
+    """ Start at most one background refresh per entry """
+    task = _refreshing.get((table, key))
+    if task is not None and not task.done():
+        return
+
+    async def run():
+        try:
+            await refresh()
+        except REQUEST_ERRORS as e:
+            print(f"Reference refresh failed for {table}/{key}: {e!r}")
+        finally:
+            _refreshing.pop((table, key), None)
+
+    _refreshing[(table, key)] = create_task_with_priority(run(), BACKGROUND)
+
+
+async def _get_json(url: str, params: dict, phase: str, extract=None):
+    headers = await amadeus_headers()
+    if headers is None:
+        raise HttpError(401, url, "No Amadeus access token")
+    try:
+        return await request_json("GET", url, headers=headers, params=params,
+                                  provider="amadeus", phase=phase, extract=extract) or {}
+    except HttpError as e:
+        if e.status == 401:
+            get_token_manager().invalidate()
+        raise
+
+
+class HotelIdsExtractor(JsonExtractor):
+    """ Reads only the hotel IDs of a hotels by-city answer, up to MAX_CITY_HOTELS """
+
+    def __init__(self):
+        self.hotel_ids = []
+        super().__init__(values={"data.item.hotelId": self._hotel_id})
+
+    def _hotel_id(self, hotel_id) -> bool:
+        self.hotel_ids.append(hotel_id)
+        return len(self.hotel_ids) >= MAX_CITY_HOTELS
+
+    def result(self) -> list[str]:
+        return self.hotel_ids
+
+
+async def fetch_city_hotel_ids(city_code: str) -> list[str]:
+    """ Download the hotel IDs of a city from Amadeus and store them """
+    hotel_ids = await _get_json(
+        f"{AMADEUS_BASE_URL}/v1/reference-data/locations/hotels/by-city",
+        {'cityCode': city_code},
+        "hotel_list",
+        extract=HotelIdsExtractor,
+    ) or []
+    _connection().execute(
+        "INSERT OR REPLACE INTO city_hotels VALUES (?, ?, ?)",
+        (city_code, ",".join(hotel_ids), time.time()),
+    )
+    return hotel_ids
+
+
+async def fetch_city_geocode(city: str) -> tuple[float, float] | None:
+    """ Geocode a city name with Amadeus and store the result """
+    response = await _get_json(
+        f"{AMADEUS_BASE_URL}/v1/reference-data/locations",
+        {'keyword': city, 'subType': 'CITY'},
+        "geocode",
+    )
+    if not response.get('data'):
+        return None
+    geo = response['data'][0]['geoCode']
+    latitude, longitude = float(geo['latitude']), float(geo['longitude'])
+    _connection().execute(
+        "INSERT OR REPLACE INTO city_geocodes VALUES (?, ?, ?, ?)",
+        (city.strip().casefold(), latitude, longitude, time.time()),
+    )
+    return latitude, longitude
+
+
+async def fetch_airport_city(airport_iata: str) -> tuple[str, str] | None:
+    """ Look up the city an airport serves with Amadeus and store it """
+    response = await _get_json(
+        f"{AMADEUS_BASE_URL}/v1/reference-data/locations",
+        {'keyword': airport_iata, 'subType': 'AIRPORT'},
+        "airport",
+    )
+    for location in response.get('data', []):
+        if location.get('iataCode') != airport_iata:
+            continue
+        address = location.get('address', {})
+        if not address.get('cityCode') or not address.get('cityName'):
+            return None
+        city = (address['cityCode'], address['cityName'].title())
+        _connection().execute(
+            "INSERT OR REPLACE INTO airport_cities VALUES (?, ?, ?, ?)",
+            (airport_iata, *city, time.time()),
+        )
+        return city
+    return None
+
+
+async def city_hotel_ids(city_code: str) -> list[str]:
+    """
+    All hotel IDs of a city, from the local store when possible.
+    """
+    city_code = city_code.strip().upper()
+    row = _connection().execute(
+        "SELECT hotel_ids, updated_at FROM city_hotels WHERE city_code = ?", (city_code,)
+    ).fetchone()
+    annotate(reference_hotels="miss" if row is None else "hit")
+    if row is None:
+        return await fetch_city_hotel_ids(city_code)
+
+    hotel_ids, updated_at = row
+    if _is_stale(updated_at):
+        _refresh_in_background("city_hotels", city_code, lambda: fetch_city_hotel_ids(city_code))
+    return hotel_ids.split(",") if hotel_ids else []
+
+
+async def city_geocode(city: str) -> tuple[float, float] | None:
+    """
+    Latitude and longitude of a city, from the local store when possible.
+    """
+    row = _connection().execute(
+        "SELECT latitude, longitude, updated_at FROM city_geocodes WHERE city = ?", (city.strip().casefold(),)
+    ).fetchone()
+    annotate(reference_geocode="miss" if row is None else "hit")
+    if row is None:
+        return await fetch_city_geocode(city)
+
+    latitude, longitude, updated_at = row
+    if _is_stale(updated_at):
+        _refresh_in_background("city_geocodes", city, lambda: fetch_city_geocode(city))
+    return latitude, longitude
+
+
+async def airport_city(airport_iata: str) -> tuple[str, str] | None:
+    """
+    (city code, city name) an airport serves, from the bundled dataset or the local store when possible.
+    """
+    airport_iata = airport_iata.strip().upper()
+    city = local_airport_city(airport_iata)
+    if city is not None:
+        annotate(reference_airport="bundled")
+        return city
+    row = _connection().execute(
+        "SELECT city_code, city_name, updated_at FROM airport_cities WHERE airport_iata = ?", (airport_iata,)
+    ).fetchone()
+    annotate(reference_airport="miss" if row is None else "hit")
+    if row is None:
+        return await fetch_airport_city(airport_iata)
+
+    city_code, city_name, updated_at = row
+    if _is_stale(updated_at):
+        _refresh_in_background("airport_cities", airport_iata, lambda: fetch_airport_city(airport_iata))
+    return city_code, city_name
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from collections import deque
+
+# Seconds one call to a provider may take, retries included
+PROVIDER_DEADLINES = {
+    "skyscanner": 8.0,
+    "amadeus": 6.0,
+    "ticketmaster": 4.0,
+    "sendgrid": 10.0,
+}
+DEFAULT_DEADLINE = 10.0
+
+# A duplicate request is sent once the first one outlives the observed p95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY = 0.05
+LATENCY_WINDOW = 200
+
+# Consecutive failures that open a provider's circuit, and how long it stays open
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 30.0
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is unavailable right now")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    """
+    Fails calls to a provider fast after repeated failures.
+
+    After BREAKER_FAILURES consecutive failures the circuit opens and calls
+    raise CircuitOpenError. Once the cooldown passes a single probe call is
+    let through: its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, provider: str, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN):
+        self.provider = provider
+        self.max_failures = failures
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        """ Whether calls would currently fail fast """
+        if self.opened_at is None:
+            return False
+        return self._probing or time.monotonic() - self.opened_at < self.cooldown
+
+    def check(self) -> bool:
+        """ Raise CircuitOpenError unless a call may go through; True if that call is the probe """
+        if self.is_open:
+            raise CircuitOpenError(self.provider)
+        if self.opened_at is not None:
+            self._probing = True
+            return True
+        return False
+
+    def end_probe(self):
+        """ Let another call probe if this probe ended without an outcome, e.g. cancelled """
+        self._probing = False
+
+    def record(self, ok: bool):
+        if not ok and self.opened_at is not None and not self._probing:
+            # Calls sent before the circuit opened keep failing, they must not push the cooldown back
+            return
+        if ok:
+            if self.opened_at is not None:
+                print(f"{self.provider} circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+            return
+        self.failures += 1
+        if self._probing or self.failures >= self.max_failures:
+            if not self._probing:
+                print(f"{self.provider} circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """ Rolling p95 of one provider call's latency """
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+        self._p95 = None
+        self._added = 0
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+        self._added += 1
+        # Re-sorting on every sample would cost more than it helps
+        if self._added % 10 == 0:
+            self._p95 = None
+
+    def p95(self) -> float | None:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        if self._p95 is None:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[int(len(ordered) * 0.95) - 1]
+        return self._p95
+
+
+_breakers = {}
+_latencies = {}
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    breaker = _breakers.get(provider)
+    if breaker is None:
+        breaker = _breakers[provider] = CircuitBreaker(provider)
+    return breaker
+
+
+def provider_unavailable(provider: str) -> bool:
+    """ Whether tools should answer with a degraded result instead of calling provider """
+    return get_breaker(provider).is_open
+
+
+def get_latency(provider: str, phase: str) -> LatencyTracker:
+    tracker = _latencies.get((provider, phase))
+    if tracker is None:
+        tracker = _latencies[(provider, phase)] = LatencyTracker()
+    return tracker
+
+
+def deadline_for(provider: str) -> float:
+    return PROVIDER_DEADLINES.get(provider, DEFAULT_DEADLINE)
+
+
+async def hedged(attempt, delay: float | None, allow=lambda: True):
+    """
+    Await attempt(), starting a second attempt() if the first takes longer than
+    delay and allow() still agrees.
+
+    Returns the result of the first attempt to succeed, cancelling the other,
+    and whether a hedge was sent. Raises if every attempt failed.
+    """
+    first = asyncio.create_task(attempt())
+    tasks = {first}
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=max(delay, HEDGE_MIN_DELAY))
+            if not done and allow():
+                tasks.add(asyncio.create_task(attempt()))
+        hedge_sent = len(tasks) > 1
+        while True:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                return succeeded[0].result(), hedge_sent
+            if not tasks:
+                return done.pop().result(), hedge_sent
+    finally:
+        for task in tasks:
+            task.cancel()
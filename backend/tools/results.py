@@ -0,0 +1,137 @@
+import itertools
+from collections import OrderedDict
+
+# Character budget of one tool answer, roughly 4 characters per LLM token
+TOOL_BUDGETS = {
+    "flights": 900,
+    "group_flights": 900,
+    "hotels": 1200,
+    "events": 1200,
+}
+DEFAULT_BUDGET = 1000
+MAX_FIELD_CHARS = 60
+# Pages share their rows with the cached answers they come from, so keeping many is cheap
+MAX_PAGED_RESULTS = 4096
+
+_handles = itertools.count(1)
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        value = f"{value:.0f}"
+    text = " ".join(str(value).split()).replace("|", "/")
+    if len(text) > MAX_FIELD_CHARS:
+        text = text[:MAX_FIELD_CHARS - 1].rstrip() + "…"
+    return text
+
+
+class ResultPages:
+    """
+    Rows that did not fit in a tool answer, kept so the agent can page through
+    them with a handle instead of repeating the upstream search.
+    """
+
+    def __init__(self, max_entries: int = MAX_PAGED_RESULTS):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # handle -> [tool, title, columns, rows, offset], rows never copied
+
+    def put(self, tool: str, title: str, columns, rows, offset: int) -> str:
+        handle = f"{tool[0]}{next(_handles)}"
+        self._entries[handle] = [tool, title, columns, rows, offset]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return handle
+
+    def next_page(self, handle: str) -> str:
+        entry = self._entries.get(handle)
+        if entry is None:
+            return f"Results '{handle}' have expired, please search again."
+        tool, title, columns, rows, offset = entry
+        text, shown = _render(tool, title, columns, rows, offset)
+        if offset + shown < len(rows):
+            entry[4] = offset + shown
+            self._entries.move_to_end(handle)
+            text += f"\n{len(rows) - offset - shown} more available, call more_results with handle '{handle}'."
+        else:
+            del self._entries[handle]
+        return text
+
+
+result_pages = ResultPages()
+
+
+def _render(tool: str, title: str, columns, rows, offset: int = 0, max_rows: int | None = None):
+    """ Render rows from offset until the tool budget is used, returning (text, rows shown) """
+    budget = TOOL_BUDGETS.get(tool, DEFAULT_BUDGET)
+    lines = [f"## {title}", " | ".join(columns)]
+    used = sum(len(line) + 1 for line in lines)
+    shown = 0
+    for row in rows[offset:]:
+        if max_rows is not None and shown >= max_rows:
+            break
+        line = " | ".join(_cell(value) for value in row)
+        # Always show at least one row, even when it alone exceeds the budget
+        if shown and used + len(line) + 1 > budget:
+            break
+        lines.append(line)
+        used += len(line) + 1
+        shown += 1
+    return "\n".join(lines), shown
+
+
+class ResultTable:
+    """
+    A tool answer before rendering.
+
+    Cached searches keep these rather than text, so every answer rendered from
+    the cache gets its own more_results handle and paging position.
+    """
+
+    __slots__ = ("tool", "title", "columns", "rows", "notes", "max_rows")
+
+    def __init__(self, tool: str, title: str, columns, rows, notes=(), max_rows: int | None = None):
+        self.tool = tool
+        self.title = title
+        self.columns = columns
+        self.rows = list(rows)
+        self.notes = list(notes)
+        self.max_rows = max_rows
+
+    def __repr__(self):
+        return f"ResultTable({self.tool}, {self.title!r}, {len(self.rows)} rows)"
+
+    def __sizeof__(self):
+        # Rough estimate for the cache's byte budget, like the repr estimate of other values
+        return 64 + len(repr(self.rows)) + len(repr(self.notes))
+
+    def render(self) -> str:
+        """ Compact, budgeted table for the LLM, with a new handle for the rows that didn't fit """
+        text, shown = _render(self.tool, self.title, self.columns, self.rows, max_rows=self.max_rows)
+        lines = [text]
+        if shown < len(self.rows):
+            handle = result_pages.put(self.tool, self.title, self.columns, self.rows, shown)
+            lines.append(f"{len(self.rows) - shown} more available, call more_results with handle '{handle}'.")
+        lines.extend(self.notes)
+        return "\n".join(lines)
+
+
+def rendered(answer):
+    """ Text of a tool answer, rendering it if it is still a ResultTable """
+    return answer.render() if isinstance(answer, ResultTable) else answer
+
+
+def render_result(tool: str, title: str, columns, rows, notes=(), max_rows: int | None = None) -> str:
+    """
+    Compact, budgeted table for the LLM: one header line, one dense line per row.
+
+    Rows beyond the budget (or max_rows) are kept in result_pages and announced
+    with a handle the agent can pass to more_results.
+    """
+    return ResultTable(tool, title, columns, rows, notes, max_rows).render()
+
+
+def more_results(handle: str) -> str:
+    """ Next page of a previous tool answer """
+    return result_pages.next_page(handle.strip())
@@ -0,0 +1,174 @@
+import contextvars
+import functools
+import json
+import os
+import time
+from collections import OrderedDict, deque
+
+# Where dump_session() writes timelines and metrics, empty to disable
+TRACE_DIR = os.getenv("TRACE_DIR") or ""
+MAX_SPANS_PER_SESSION = 2000
+MAX_SESSIONS = 64
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_session_id = contextvars.ContextVar("trace_session", default="-")
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_timelines = OrderedDict()  # session id -> deque of finished span dicts
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram keyed by a tuple of label values.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.setdefault(labels, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series[-1]}")
+        return lines
+
+
+TOOL_LATENCY = Histogram("tool_latency_seconds", "Agent function tool latency", ("tool",))
+PROVIDER_LATENCY = Histogram("provider_latency_seconds", "Upstream request latency", ("provider", "phase"))
+
+
+class Span:
+    """
+    One timed phase of a tool call or upstream request.
+
+    Use as a context manager; attributes set with set() end up in the session
+    timeline and the latency histograms when the span closes.
+    """
+
+    __slots__ = ("name", "kind", "attrs", "start", "duration", "parent", "_token")
+
+    def __init__(self, name: str, kind: str = "internal", **attrs):
+        self.name = name
+        self.kind = kind
+        self.attrs = attrs
+        self.start = 0.0
+        self.duration = 0.0
+        self.parent = None
+        self._token = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.time() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _finish(self)
+        return False
+
+
+def span(name: str, kind: str = "internal", **attrs) -> Span:
+    return Span(name, kind, **attrs)
+
+
+def annotate(**attrs):
+    """ Add attributes to the innermost open span, if any """
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def record_span(name: str, kind: str, start: float, **attrs):
+    """ Record a phase that began at start (time.time()) and ends now, when no with block spans it """
+    finished = Span(name, kind, **attrs)
+    finished.start = start
+    finished.duration = time.time() - start
+    _finish(finished)
+
+
+def set_session(session_id: str):
+    """ Tag every span recorded in this context (and tasks it spawns) with a session """
+    _session_id.set(session_id)
+
+
+def _finish(finished: Span):
+    if finished.kind == "tool":
+        TOOL_LATENCY.observe((finished.name,), finished.duration)
+    elif finished.kind == "provider":
+        PROVIDER_LATENCY.observe((finished.attrs.get("provider", "-"), finished.attrs.get("phase", "-")), finished.duration)
+
+    session_id = _session_id.get()
+    timeline = _timelines.get(session_id)
+    if timeline is None:
+        timeline = _timelines[session_id] = deque(maxlen=MAX_SPANS_PER_SESSION)
+        while len(_timelines) > MAX_SESSIONS:
+            _timelines.popitem(last=False)
+    timeline.append({
+        "name": finished.name,
+        "kind": finished.kind,
+        "parent": finished.parent.name if finished.parent is not None else None,
+        "start": round(finished.start, 6),
+        "ms": round(finished.duration * 1000, 2),
+        **finished.attrs,
+    })
+
+
+def traced_tool(fn):
+    """
+    Decorator timing an agent function tool as a "tool" span.
+    """
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with span(fn.__name__, "tool") as tool_span:
+            result = await fn(*args, **kwargs)
+            tool_span.set(bytes=len(result) if isinstance(result, str) else 0)
+            return result
+    return wrapper
+
+
+def session_timeline(session_id: str) -> list[dict]:
+    """ Spans recorded for a session, oldest first """
+    return list(_timelines.get(session_id, ()))
+
+
+def render_metrics() -> str:
+    """ All histograms in the Prometheus text exposition format """
+    return "\n".join(TOOL_LATENCY.render() + PROVIDER_LATENCY.render()) + "\n"
+
+
+def dump_session(session_id: str):
+    """
+    Write a session's timeline (JSON lines) and this process' metrics to TRACE_DIR.
+    """
+    if not TRACE_DIR:
+        return
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in session_id)
+    with open(os.path.join(TRACE_DIR, f"timeline-{safe_id}.jsonl"), "w") as f:
+        for record in session_timeline(session_id):
+            f.write(json.dumps(record, default=str) + "\n")
+    # Textfile-collector style: one file per worker process
+    with open(os.path.join(TRACE_DIR, f"metrics-{os.getpid()}.prom"), "w") as f:
+        f.write(render_metrics())
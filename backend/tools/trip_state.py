@@ -0,0 +1,103 @@
+import itertools
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+
+# ID prefix of each kind of item the tools return
+ITEM_PREFIXES = {
+    "flight": "F",
+    "hotel": "H",
+    "event": "E",
+}
+MAX_CATALOG_ITEMS = 20000
+# Table lines of a tool answer start with the item ID
+ITEM_LINE = re.compile(r"^([FHE]\d+) \|", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class TripItem:
+    """A flight, hotel or event a tool returned, with the fields the email shows."""
+    id: str
+    kind: str
+    title: str
+    details: tuple  # ((label, value), ...)
+
+
+class ItemCatalog:
+    """
+    Every item the tools rendered in this process, by ID.
+
+    The same item always gets the same ID, so cached tool answers shared by
+    several sessions refer to the same items.
+    """
+
+    def __init__(self, max_items: int = MAX_CATALOG_ITEMS):
+        self.max_items = max_items
+        self._by_key = {}  # (kind, key) -> id
+        self._items = OrderedDict()  # id -> ((kind, key), TripItem)
+        self._counters = {kind: itertools.count(1) for kind in ITEM_PREFIXES}
+
+    def add(self, kind: str, key, title: str, details) -> TripItem:
+        item_id = self._by_key.get((kind, key))
+        if item_id is not None:
+            self._items.move_to_end(item_id)
+            return self._items[item_id][1]
+        item_id = f"{ITEM_PREFIXES[kind]}{next(self._counters[kind])}"
+        item = TripItem(item_id, kind, title, tuple((label, str(value)) for label, value in details))
+        self._by_key[(kind, key)] = item_id
+        self._items[item_id] = ((kind, key), item)
+        while len(self._items) > self.max_items:
+            _, (old_key, _) = self._items.popitem(last=False)
+            del self._by_key[old_key]
+        return item
+
+    def get(self, item_id: str) -> TripItem | None:
+        entry = self._items.get(item_id)
+        return None if entry is None else entry[1]
+
+
+item_catalog = ItemCatalog()
+
+
+def trip_item(kind: str, key, title: str, details) -> str:
+    """ Register an item about to be shown to the LLM and return its ID """
+    return item_catalog.add(kind, key, title, details).id
+
+
+class TripState:
+    """
+    The flights, hotels and events one session was shown, and the ones the user picked.
+    """
+
+    def __init__(self):
+        self.items = OrderedDict()  # id -> TripItem
+        self.picks = []
+
+    def record(self, answer):
+        """ Remember the items a tool answer lists, returning the answer unchanged """
+        if isinstance(answer, str):
+            for item_id in ITEM_LINE.findall(answer):
+                item = item_catalog.get(item_id)
+                if item is not None:
+                    self.items[item_id] = item
+        return answer
+
+    def pick(self, item_ids) -> list[str]:
+        """ Mark items as chosen by the user, returning the IDs this session never saw """
+        unknown = []
+        for item_id in item_ids:
+            item_id = item_id.strip().upper()
+            if item_id not in self.items:
+                unknown.append(item_id)
+            elif item_id not in self.picks:
+                self.picks.append(item_id)
+        return unknown
+
+    def selection(self, per_kind: int = 3) -> list[TripItem]:
+        """ The picked items, or the first few shown of each kind when nothing was picked """
+        if self.picks:
+            return [self.items[item_id] for item_id in self.picks]
+        shown = []
+        for kind in ITEM_PREFIXES:
+            shown.extend([item for item in self.items.values() if item.kind == kind][:per_kind])
+        return shown
@@ -0,0 +1,32 @@
+from tools.http_client import get_session, REQUEST_ERRORS
+from tools.amadeus_auth import get_token_manager
+from tools.flights import SKYSCANNER_BASE_URL
+from tools.events import TICKETMASTER_BASE_URL
+from tools.emails import SENDGRID_BASE_URL, outbox
+from tools import reference
+from tools.locations import get_index
+
+
+async def warm_up_tools():
+    """
+    Open the HTTP pool, the reference store, the location index and the
+    Amadeus token before the first tool call, so the first search of a room
+    doesn't pay for them.
+    """
+    reference._connection()
+    get_index()
+
+    # Picks up emails a previous worker process queued but never delivered
+    outbox.start()
+
+    # Fetching the token also opens a keep-alive connection to Amadeus
+    await get_token_manager().get_token()
+
+    session = get_session()
+    for base_url in (SKYSCANNER_BASE_URL, TICKETMASTER_BASE_URL, SENDGRID_BASE_URL):
+        try:
+            # Any answer will do, this only establishes the TLS connection
+            async with session.head(base_url) as response:
+                await response.read()
+        except REQUEST_ERRORS as e:
+            print(f"Warm-up of {base_url} failed: {e!r}")